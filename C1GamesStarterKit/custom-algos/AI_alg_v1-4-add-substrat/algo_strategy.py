@@ -3,9 +3,7 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 import numpy as np
-from copy import deepcopy
 import math
 from gamelib.game_state import GameState 
 from scipy.optimize import curve_fit
@@ -25,6 +23,9 @@ global UTILITY_OF_INTERCEPTING_ATTACK
 UTILITY_OF_INTERCEPTING_ATTACK = 10
 
 class AlgoStrategy(gamelib.AlgoCore):
+    # on_action_frame only looks at these events, frames without any of them are skipped unparsed
+    ACTION_FRAME_EVENTS = ["spawn", "breach", "attack"]
+
     def __init__(self):
         super().__init__()
         seed = random.randrange(maxsize)
@@ -54,6 +55,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.enemy_attack_history = [] # records the mp % used in attack
         self.enemy_defense_history = [] # records the mp % used in defense
         self.current_enemy_mp = 0
+        self.simulation_start_state = None # the board as the turn began, every simulation runs on a fork of it
         
     def on_turn(self, turn_state):
         """
@@ -63,7 +65,18 @@ class AlgoStrategy(gamelib.AlgoCore):
         unit deployments, and transmitting your intended deployments to the
         game engine.
         """
-        game_state = gamelib.GameState(self.config, turn_state)
+        # Stop the analysis started last turn before touching any board
+        with self.budget.phase("collect"):
+            warm_state = self.collect_background()
+        # Only the cells that changed since last turn are parsed again, planning happens on a fork
+        with self.budget.phase("parse"):
+            if self.simulation_start_state is None:
+                self.simulation_start_state = gamelib.GameState(self.config, turn_state)
+            else:
+                self.simulation_start_state = self.simulation_start_state.next_turn(turn_state)
+            if warm_state is not None:
+                self.simulation_start_state.reuse_analysis(warm_state)
+        game_state = self.simulation_start_state.fork()
         # gamelib.debug_write('Performing turn {} of mcts strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
 
@@ -71,7 +84,27 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.mcts_strategy(game_state)
         self.tally_spawn_stats(game_state)
         
+        # Logged before submitting, which flushes this turn's debug output
+        gamelib.debug_write(self.budget.report())
         game_state.submit_turn()
+        self.start_background(self.analyse_next_turn, game_state)
+
+    def analyse_next_turn(self, cancelled, game_state):
+        """
+        Runs in the background during the action phase. Next turn's board is this turn's with our builds,
+        unless structures die or the enemy builds, so its paths, distance fields and threat and shield maps
+        are computed now. on_turn reuses whatever still holds.
+        """
+        game_map = game_state.game_map
+        enemy_edges = game_map.get_edge_locations(game_map.TOP_LEFT) + game_map.get_edge_locations(game_map.TOP_RIGHT)
+        steps = [game_state.find_paths_from_edges, lambda: game_state.find_paths_from_edges(enemy_edges),
+                 lambda: game_state.threat_map(0), lambda: game_state.threat_map(1),
+                 lambda: game_state.shield_map(0), lambda: game_state.shield_map(1)]
+        for step in steps:
+            if cancelled():
+                return None
+            step()
+        return game_state
     
     def choose_frontline_defence_row(self, game_state):
         self.FRONTLINE_DEFENCE_ROW = 11
@@ -185,16 +218,18 @@ class AlgoStrategy(gamelib.AlgoCore):
         return most_likely_spawn_locations
 
     
-    def check_interceptor_reachability(self, game_state, unit, num, spawn_loc, front_hole, back_hole):
+    def check_interceptor_reachability(self, game_state, unit, num, spawn_loc, front_hole, back_hole, planned_state=None):
         # checks whether an interceptor can intercept an enemy unit spawned at the spawn_loc given front_hole, back_hole
+        # planned_state: game_state with front_hole, back_hole already built, only read from (built here if None)
         # returns 
         # reachable: True if the unit can be intercepted by interceptors
         # interceptor_spawn_loc: where the interceptor needs to be spawned (None if not reachable)
         # interceptor_num: how many interceptors to spawn (0 if not reachable)
         
-        copied_game_state = deepcopy(game_state)
-        
-        self.build_selected_path(copied_game_state, front_hole, back_hole)
+        if planned_state is None:
+            planned_state = game_state.overlay()
+            self.build_selected_path(planned_state, front_hole, back_hole)
+        copied_game_state = planned_state
 
         if unit == SCOUT:
             speed = 1
@@ -213,10 +248,13 @@ class AlgoStrategy(gamelib.AlgoCore):
             interceptor_range = 4.3
             
             possible_interceptor_spawns = [[7,6], [9,4], [11,2], [13,0], [14,0],[16,2],[18,4],[20,6]]
+            interceptor_paths = copied_game_state.find_paths_from_edges(possible_interceptor_spawns)
             interceptor_utility = {}
             for interceptor_spawn_location in possible_interceptor_spawns:
                 frames_in_range = 0 # count how many frames the unit will be seen by our interceptor
-                interceptor_path = copied_game_state.find_path_to_edge(interceptor_spawn_location)
+                interceptor_path = interceptor_paths.get(tuple(interceptor_spawn_location))
+                if interceptor_path is None:
+                    continue
 
                 interceptor_index = -1
                 earliest_interception_frame = len(enemy_path)
@@ -270,9 +308,18 @@ class AlgoStrategy(gamelib.AlgoCore):
         most_likely_locations = {}
         most_likely_locations.update(most_likely_scout_locations)
         most_likely_locations.update(most_likely_demolisher_locations)
-        gamelib.debug_write('most likely enemy spawn locations: ', most_likely_locations)
+        gamelib.debug_write('most likely enemy spawn locations: ', most_likely_locations, level=gamelib.DEBUG)
         # gamelib.debug_write('stats for (3,17) ', most_likely_locations.get((3,17)))
         
+        # build every hole layout once, and get all of their distance fields in one vectorized call per edge
+        planned_states = {}
+        for front_hole in self.frontline_hole_locations:
+            for back_hole in self.backline_hole_locations:
+                planned_state = game_state.overlay()
+                self.build_selected_path(planned_state, front_hole, back_hole)
+                planned_states[(tuple(front_hole), tuple(back_hole))] = planned_state
+        game_state.precompute_path_fields(list(planned_states.values()))
+        
         plans = []
         best_expected_utility = -np.inf
         best_plan = None
@@ -292,10 +339,10 @@ class AlgoStrategy(gamelib.AlgoCore):
                     expected_loss = 0 # placeholder for now, calculate with scout and demolisher utility
                     
                     if np.random.rand() < demolisher_prob:
-                        reachable, interceptor_spawn_loc, interceptor_num, interception_utility = self.check_interceptor_reachability(game_state=game_state, unit=DEMOLISHER, num=demolisher_num, spawn_loc=coord, front_hole=front_hole, back_hole=back_hole)
+                        reachable, interceptor_spawn_loc, interceptor_num, interception_utility = self.check_interceptor_reachability(game_state=game_state, unit=DEMOLISHER, num=demolisher_num, spawn_loc=coord, front_hole=front_hole, back_hole=back_hole, planned_state=planned_states[(tuple(front_hole), tuple(back_hole))])
                         prob = demolisher_prob
                     else:
-                        reachable, interceptor_spawn_loc, interceptor_num, interception_utility = self.check_interceptor_reachability(game_state=game_state, unit=SCOUT, num=scout_num, spawn_loc=coord, front_hole=front_hole, back_hole=back_hole)
+                        reachable, interceptor_spawn_loc, interceptor_num, interception_utility = self.check_interceptor_reachability(game_state=game_state, unit=SCOUT, num=scout_num, spawn_loc=coord, front_hole=front_hole, back_hole=back_hole, planned_state=planned_states[(tuple(front_hole), tuple(back_hole))])
                         prob = scout_prob
                         
                     if reachable:
@@ -312,9 +359,17 @@ class AlgoStrategy(gamelib.AlgoCore):
                     
                     plans.append(plan)
                     if expected_utility > best_expected_utility:
-                        gamelib.debug_write('turn', game_state.turn_number,'new best plan', plan)
+                        gamelib.debug_write('turn', game_state.turn_number,'new best plan', plan, level=gamelib.DEBUG)
                         best_expected_utility = expected_utility
                         best_plan = plan.copy()
+                    # out of time, settle for the best plan found so far
+                    if self.budget.expired():
+                        break
+                if self.budget.expired():
+                    break
+            if self.budget.expired():
+                gamelib.debug_write('turn', game_state.turn_number, 'defence search stopped early after', len(plans), 'plans')
+                break
                         
         self.execute_defence_plan(game_state, best_plan)                
         
@@ -336,7 +391,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             for front_hole in self.frontline_hole_locations:
                 for spawn_location in spawn_location_options:
                     
-                    copied_game_state = deepcopy(game_state)
+                    copied_game_state = game_state.overlay()
                     self.build_selected_path(copied_game_state, front_hole=front_hole, back_hole=back_hole)
                     
                     
@@ -360,6 +415,14 @@ class AlgoStrategy(gamelib.AlgoCore):
                         "units": [{'type': DEMOLISHER, 'num': int(num_demolishers), 'loc': spawn_location}],
                         "structures": []
                         })
+                    # out of time, settle for the best action found so far
+                    if self.budget.expired():
+                        break
+                if self.budget.expired():
+                    break
+            if self.budget.expired():
+                gamelib.debug_write('turn', game_state.turn_number, 'offence search stopped early after', len(possible_actions), 'actions')
+                break
 
         highest_utility = -np.inf
         best_action = possible_actions[0]
@@ -502,10 +565,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         num = np.random.rand()
         if num <= hla_strategy['attack']:
             gamelib.debug_write("performing attack on turn ", game_state.turn_number)
-            self.choose_offence_move(game_state, sub_strategy)
+            with self.budget.phase("offence"):
+                self.choose_offence_move(game_state, sub_strategy)
         elif num <= hla_strategy['attack'] + hla_strategy['defend']:
             gamelib.debug_write("performing defence on turn ", game_state.turn_number)
-            self.choose_defence_move(game_state) # TODO: David
+            with self.budget.phase("defence"):
+                self.choose_defence_move(game_state) # TODO: David
         else:
             # do nothing
             pass
@@ -577,9 +642,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        turn_num = state["turnInfo"][1]
-        events = state["events"]
+        turn_num = turn_string.turn_number
+        events = turn_string.events
         
         spawns = events["spawn"]
         if turn_num not in self.spawn_stats:
@@ -623,7 +687,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             # When parsing the frame data directly, 
             # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
             if not unit_owner_self:
-                gamelib.debug_write("Got scored on at: {}".format(location))
+                gamelib.debug_write("Got scored on at", location, level=gamelib.DEBUG)
                 spawn_coord = self.spawn_stats[turn_num]['id_info'][id]['coord']
                 self.spawn_stats[turn_num]['id_info'][id]['health_taken'] = 1
 
@@ -673,6 +737,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             if unit.stationary:
                 unit_dmg += dmg_done
 
+        game_state.game_map.refresh_cell(loc)
         return unit_dmg, structures_destroyed, units_to_destroy
 
     def _is_valid_attacker(self, game_state, location, attacker):
@@ -691,8 +756,7 @@ class AlgoStrategy(gamelib.AlgoCore):
             damage += attacker.damage_f
         return damage
 
-    def _dealt_dmg(self, game_state, unit):
-        unit_to_attack = game_state.get_target(unit)
+    def _dealt_dmg(self, game_state, unit, unit_to_attack):
         if unit_to_attack is None:
             return None
 
@@ -731,30 +795,34 @@ class AlgoStrategy(gamelib.AlgoCore):
         unit_dmg = 0
         units_to_destroy = []
 
-        for location, unit_list in mobiles.items():
-            # gamelib.debug_write('unit list', unit_list)
-            for unit_details in unit_list:
-                if not unit_details[1]:
-                    continue
-                unit = unit_details[1][0]
-                action_result = self._dealt_dmg(game_state, unit)
-                if action_result is None:
-                    continue
-                # Target found, get damage done
-                unit_to_attack, damage = action_result
+        # Resolve every target on the board as it is, then only redo the units whose range holds a unit hit meanwhile
+        attacking_stacks = [unit_details for unit_list in mobiles.values() for unit_details in unit_list if unit_details[1]]
+        targets = game_state.get_targets([unit_details[1][0] for unit_details in attacking_stacks])
+        damaged_cells = set()
+
+        for unit_details, unit_to_attack in zip(attacking_stacks, targets):
+            unit = unit_details[1][0]
+            if damaged_cells and not damaged_cells.isdisjoint(game_state.game_map.get_cells_in_range([unit.x, unit.y], unit.attackRange)[0]):
+                unit_to_attack = game_state.get_target(unit)
+            action_result = self._dealt_dmg(game_state, unit, unit_to_attack)
+            if action_result is None:
+                continue
+            # Target found, get damage done
+            unit_to_attack, damage = action_result
 
-                # Compute number of units destroyed / health lowered and apply to the game units
-                num_attack_units = len(unit_details[1])
-                effective_dmg = damage * num_attack_units
+            # Compute number of units destroyed / health lowered and apply to the game units
+            num_attack_units = len(unit_details[1])
+            effective_dmg = damage * num_attack_units
 
-                attack_location = unit_to_attack.x, unit_to_attack.y
-                
-                _unit_dmg, _structures_destroyed, _units_to_destroy = \
-                    self._attack_unit(game_state, unit_to_attack, attack_location, effective_dmg)
+            attack_location = unit_to_attack.x, unit_to_attack.y
+            damaged_cells.add(unit_to_attack.x * game_state.ARENA_SIZE + unit_to_attack.y)
+            
+            _unit_dmg, _structures_destroyed, _units_to_destroy = \
+                self._attack_unit(game_state, unit_to_attack, attack_location, effective_dmg)
 
-                unit_dmg += _unit_dmg
-                structure_destroyed = structure_destroyed or _structures_destroyed
-                units_to_destroy.extend(_units_to_destroy)
+            unit_dmg += _unit_dmg
+            structure_destroyed = structure_destroyed or _structures_destroyed
+            units_to_destroy.extend(_units_to_destroy)
 
         return unit_dmg, structure_destroyed, units_to_destroy
                 
@@ -774,7 +842,11 @@ class AlgoStrategy(gamelib.AlgoCore):
                 
         for loc, unit in enemies_to_destroy:
             # gamelib.debug_write(f"Enemy to destroy {unit}")
-            game_state.game_map[loc].remove(unit)
+            if unit.stationary:
+                game_state.game_map.remove_unit(loc)
+            else:
+                game_state.game_map[loc].remove(unit)
+                game_state.game_map.refresh_cell(loc)
             if loc in enemy_mobiles:
                 for unit_details in enemy_mobiles[loc]:
                     if unit in unit_details[1]:
@@ -782,7 +854,11 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         for loc, unit in friendlies_to_destroy:
             # gamelib.debug_write(f"Friendly to destroy {unit}")
-            game_state.game_map[loc].remove(unit)
+            if unit.stationary:
+                game_state.game_map.remove_unit(loc)
+            else:
+                game_state.game_map[loc].remove(unit)
+                game_state.game_map.refresh_cell(loc)
             if loc in friendly_mobiles:
                 for unit_details in friendly_mobiles[loc]:
                     if unit in unit_details[1]:
@@ -817,6 +893,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
                 # Add the game units into the list
                 game_state.game_map[new_location_tup].extend(unit_details[1])
+                game_state.game_map.refresh_cell(new_location_tup)
 
                 for unit in unit_details[1]:
                     unit.x = new_location[0]
@@ -851,12 +928,14 @@ class AlgoStrategy(gamelib.AlgoCore):
         """
         Define an action as unit, num, location.
 
-        Local copy of game_state is deep copied to prevent mutation. Simply resumbit the chosen
+        Runs on a fork of the board as the turn began to prevent mutation. Simply resumbit the chosen
         action on the original game_state to submit the action outside of this function.
         """
 
-        # Should suffice for a deep copy as game map is reinitialized
-        game_state = GameState(game_state.config, game_state.serialized_string)
+        # The turn start board is only parsed once per turn, each simulation gets its own fork
+        if self.simulation_start_state is None or self.simulation_start_state.serialized_string != game_state.serialized_string:
+            self.simulation_start_state = GameState(game_state.config, game_state.serialized_string)
+        game_state = self.simulation_start_state.fork()
 
         # gamelib.debug_write("Start simulation")
 
@@ -16,14 +16,19 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to path-finding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The TurnBudget class in budget.py tracks the time left in a turn. AlgoCore starts one as each turn arrives, 
+search loops check it to return their best plan before the engine's time limit. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+Its output is leveled and buffered until the turn is submitted, set_debug_output() changes how.
 """
 
-from .algocore import AlgoCore
-from .util import debug_write
+from .algocore import AlgoCore, ActionFrame
+from .util import debug_write, debug_enabled, set_debug_output, flush_debug, DEBUG, INFO, WARNING, ERROR, OFF
 from .game_state import GameState
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, GameMapOverlay
+from .budget import TurnBudget
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "budget", "game_state", "game_map", "navigation", "unit", "util"]
  
\ No newline at end of file
@@ -1,7 +1,82 @@
 import json
+import threading
 
+from .budget import TurnBudget
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .util import get_command, debug_write, flush_debug, BANNER_TEXT, send_command, WARNING, ERROR
+
+
+def message_type(game_state_string):
+    """Reads turnInfo[0] of a message from the engine without parsing the whole message
+
+    Args:
+        game_state_string: A message holding a turnInfo
+
+    Returns:
+        0 for a turn, 1 for an action frame, 2 for the end of the game, None if the message has no turnInfo
+    """
+    start = game_state_string.find('"turnInfo"')
+    if start < 0:
+        return None
+    start = game_state_string.find('[', start) + 1
+    try:
+        return int(game_state_string[start:game_state_string.find(',', start)])
+    except ValueError:
+        return int(json.loads(game_state_string)["turnInfo"][0])
+
+
+def has_events(game_state_string, event_types):
+    """Checks whether a frame holds any event of the given types, without parsing it
+
+    Args:
+        game_state_string: An action frame
+        event_types: The event types to look for, like "breach" or "spawn"
+
+    Returns:
+        False only if every one of those event lists is empty
+    """
+    events = max(game_state_string.find('"events"'), 0)
+    for event_type in event_types:
+        index = game_state_string.find('"{}"'.format(event_type), events)
+        if index < 0:
+            return True
+        # An empty list closes right after it opens
+        index = game_state_string.find('[', index) + 1
+        if not game_state_string[index:index + 16].lstrip().startswith("]"):
+            return True
+    return False
+
+
+class ActionFrame(str):
+    """A frame of the action phase, as sent by the engine.
+    It is the frame's string, so it can still be given to json.loads, but it parses itself
+    the first time one of its fields is read and keeps the result.
+
+    Attributes :
+        * state (dict): The whole frame, parsed
+        * turn_info (list): The state type, the turn number and the frame number
+        * turn_number (int): The turn this frame belongs to
+        * events (dict): The lists of events of this frame, by event type
+
+    """
+    @property
+    def state(self):
+        if "_state" not in self.__dict__:
+            self._state = json.loads(self)
+        return self._state
+
+    @property
+    def turn_info(self):
+        return self.state["turnInfo"]
+
+    @property
+    def turn_number(self):
+        return self.state["turnInfo"][1]
+
+    @property
+    def events(self):
+        return self.state["events"]
+
 
 class AlgoCore(object):
     """
@@ -10,10 +85,18 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * budget (:obj: TurnBudget): The time left for the current turn, restarted as each turn arrives.
+          Searches in on_turn should check budget.expired() and settle for their best plan so far
+        * ACTION_FRAME_EVENTS (list): Which action frames on_action_frame gets. None for every frame,
+          an empty list for none, or event types such as "breach", "spawn" or "attack" for only the frames holding one of them
 
     """
+    ACTION_FRAME_EVENTS = None
+
     def __init__(self):
         self.config = None
+        self.budget = TurnBudget(float("inf"))
+        self.__background = None
 
     def on_game_start(self, config):
         """
@@ -38,12 +121,50 @@ class AlgoCore(object):
         """
         After each deploy phase, the game engine will run the action phase of the round.
         The action phase is made up of a sequence of distinct frames. 
-        Each of these frames is sent to the algo in order. 
+        Each of these frames is sent to the algo in order, as an ActionFrame, filtered by ACTION_FRAME_EVENTS. 
         They can be handled in this function. 
         """
         pass
 
 
+    def start_background(self, work, *args):
+        """
+        Runs work(cancelled, *args) on a background thread, typically right after submitting a turn, so the analysis
+        of the next turn runs while the engine streams the action phase and this thread waits on stdin.
+        work should check cancelled() between its steps and return early once it is True.
+        Only one piece of work runs at a time, starting another one cancels the previous one.
+        """
+        self.collect_background()
+        cancel = threading.Event()
+        result = []
+
+        def run():
+            try:
+                result.append(work(cancel.is_set, *args))
+            except Exception as error:
+                debug_write("Background work failed: {}".format(repr(error)), level=ERROR)
+
+        thread = threading.Thread(target=run, daemon=True)
+        self.__background = (thread, cancel, result)
+        thread.start()
+
+    def collect_background(self, timeout=0):
+        """
+        Takes the result of the work given to start_background. Waits up to timeout seconds for it to finish,
+        then cancels it and waits for it to stop, so nothing runs in the background once this returns.
+        Returns None when there was no work, or it was cancelled before finishing or failed.
+        """
+        if self.__background is None:
+            return None
+        thread, cancel, result = self.__background
+        self.__background = None
+        thread.join(timeout)
+        if thread.is_alive():
+            cancel.set()
+            thread.join()
+            return None
+        return result[0] if result else None
+
     def start(self):
         """ 
         Start the parsing loop.
@@ -57,39 +178,52 @@ class AlgoCore(object):
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
             game_state_string = get_command()
-            if "replaySave" in game_state_string:
+            if not self._handle_message(game_state_string):
+                break
+
+    def _handle_message(self, game_state_string):
+        """
+        Passes one message from the engine to the matching handler.
+        Only the config is parsed here, turns and action frames are classified from their turnInfo.
+        Returns False once the game is over.
+        """
+        if "replaySave" in game_state_string:
+            """
+            This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+            """
+            parsed_config = json.loads(game_state_string)
+            self.on_game_start(parsed_config)
+            flush_debug()
+        elif "turnInfo" in game_state_string:
+            stateType = message_type(game_state_string)
+            if stateType == 0:
+                """
+                This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
+                deploy phase. Printing is handled by the provided functions.
+                """
+                self.budget = TurnBudget.for_config(self.config)
+                self.on_turn(game_state_string)
+            elif stateType == 1:
+                """
+                If stateType == 1, this game_state_string string represents a single frame of an action phase
+                """
+                if self.ACTION_FRAME_EVENTS is None or (self.ACTION_FRAME_EVENTS and has_events(game_state_string, self.ACTION_FRAME_EVENTS)):
+                    self.on_action_frame(ActionFrame(game_state_string))
+            elif stateType == 2:
                 """
-                This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+                This is the end game message. This means the game is over so break and finish the program.
                 """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
-                    """
-                    This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
-                    deploy phase. Printing is handled by the provided functions.
-                    """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
-                    """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
-                    """
-                    self.on_action_frame(game_state_string)
-                elif stateType == 2:
-                    """
-                    This is the end game message. This means the game is over so break and finish the program.
-                    """
-                    debug_write("Got end state, game over. Stopping algo.")
-                    break
-                else:
-                    """
-                    Something is wrong? Received an incorrect or improperly formatted string.
-                    """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+                debug_write("Got end state, game over. Stopping algo.")
+                flush_debug()
+                return False
             else:
                 """
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                debug_write("Got unexpected string with turnInfo: {}".format(game_state_string), level=WARNING)
+        else:
+            """
+            Something is wrong? Received an incorrect or improperly formatted string.
+            """
+            debug_write("Got unexpected string : {}".format(game_state_string), level=WARNING)
+        return True
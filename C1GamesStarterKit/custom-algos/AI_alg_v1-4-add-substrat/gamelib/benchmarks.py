@@ -0,0 +1,479 @@
+"""
+Timing harness for the hot paths of gamelib.
+
+Run it from the algo folder with `python -m gamelib.benchmarks`.
+Every benchmark works on the same late game board so numbers from different
+commits can be compared directly.
+"""
+import copy
+import json
+import os
+import random
+import sys
+import threading
+import timeit
+
+from .algocore import AlgoCore
+from .game_map import NEIGHBORS, cell_index
+from .game_state import GameState
+from .navigation import ShortestPathFinder, _blocked_from_mask, np
+from .tests import TEST_CONFIG
+from .unit import GameUnit
+from .util import DEBUG, INFO, debug_write, flush_debug, set_debug_output
+
+# Layout of a typical turn 20 defence, mirrored for the enemy
+TURRETS = [[1, 12], [26, 12], [3, 11], [24, 11], [6, 10], [11, 10], [16, 10], [21, 10],
+           [8, 9], [9, 9], [13, 9], [14, 9], [18, 9], [19, 9]]
+WALLS = ([[i, 13] for i in [0, 1, 2, 25, 26, 27]] +
+         [[i, 12] for i in [2, 3, 4, 23, 24, 25]] +
+         [[i, 11] for i in [2, 4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 25]] +
+         [[3, 10], [24, 10], [4, 9], [23, 9]] +
+         [[i, 8] for i in range(5, 23) if i != 7])
+SUPPORTS = [[12, 2], [14, 2]]
+UPGRADES = TURRETS[:8] + [[i, 13] for i in [0, 1, 2, 25, 26, 27]]
+
+
+def make_turn_20_state():
+    """Builds a GameState for turn 20 with both players fully built up
+
+    Returns:
+        A GameState with the same structures on both halves of the board
+    """
+    config = json.loads(TEST_CONFIG)
+
+    def units_for(player_index):
+        flip = (lambda loc: loc) if player_index == 0 else (lambda loc: [loc[0], 27 - loc[1]])
+        health = [unit.get("startHealth", 0) for unit in config["unitInformation"]]
+        units = [[] for _ in range(8)]
+        for type_index, locations in [(0, WALLS), (1, SUPPORTS), (2, TURRETS), (7, UPGRADES)]:
+            for location in locations:
+                x, y = flip(location)
+                units[type_index].append([x, y, health[type_index], str(len(units[type_index]))])
+        return units
+
+    state = {
+        "p1Units": units_for(0),
+        "p2Units": units_for(1),
+        "turnInfo": [0, 20, -1],
+        "p1Stats": [24.0, 12.0, 9.0, 1200],
+        "p2Stats": [21.0, 10.0, 11.0, 1400],
+        "events": {"selfDestruct": [], "breach": [], "damage": [], "shield": [], "move": [],
+                   "spawn": [], "death": [], "attack": [], "melee": []}
+    }
+    game_state = GameState(config, json.dumps(state))
+    game_state.suppress_warnings(True)
+    return game_state
+
+
+def friendly_edge_locations(game_state):
+    """All unblocked BOTTOM_LEFT and BOTTOM_RIGHT locations"""
+    game_map = game_state.game_map
+    edges = game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)
+    return [location for location in edges if not game_state.contains_stationary_unit(location)]
+
+
+def forget_paths(game_state):
+    """Empties the path cache of a GameState so the next queries search again"""
+    game_state._path_cache_version = None
+
+
+def make_game_turns(turns=100, seed=0):
+    """Builds the turn strings of a game where both players keep building on the turn 20 layout
+
+    Args:
+        turns: The number of turns
+        seed: Seeds the random builds, damage and losses
+
+    Returns:
+        A list of serialized game states, one per turn
+    """
+    rng = random.Random(seed)
+    config = json.loads(TEST_CONFIG)
+    health = [unit.get("startHealth", 0) for unit in config["unitInformation"]]
+    layout = [(0, location) for location in WALLS] + [(1, location) for location in SUPPORTS] + [(2, location) for location in TURRETS]
+    boards = [{}, {}]
+    turn_strings = []
+    for turn_number in range(turns):
+        for player_index, board in enumerate(boards):
+            for type_index, location in rng.sample(layout, 6):
+                key = (location[0], location[1] if player_index == 0 else 27 - location[1])
+                board.setdefault(key, [type_index, health[type_index], False])
+            for key in rng.sample(sorted(board), min(len(board), 4)):
+                if rng.random() < 0.3:
+                    del board[key]
+                else:
+                    board[key][1] = board[key][1] * rng.choice([1, 0.5])
+                    board[key][2] = board[key][2] or rng.random() < 0.2
+        units = [[[] for _ in range(8)] for _ in range(2)]
+        for player_index, board in enumerate(boards):
+            for (x, y), (type_index, unit_health, upgraded) in sorted(board.items()):
+                units[player_index][type_index].append([x, y, unit_health, str(x * 28 + y)])
+                if upgraded:
+                    units[player_index][7].append([x, y, 0, str(x * 28 + y)])
+        turn_strings.append(json.dumps({
+            "p1Units": units[0], "p2Units": units[1], "turnInfo": [0, turn_number, -1],
+            "p1Stats": [30.0, 20.0, 10.0, 1000], "p2Stats": [30.0, 20.0, 10.0, 1000],
+            "events": {"selfDestruct": [], "breach": [], "damage": [], "shield": [], "move": [],
+                       "spawn": [], "death": [], "attack": [], "melee": []}
+        }))
+    return turn_strings
+
+
+def report(name, seconds, count):
+    """Prints the time per call of a benchmark in microseconds"""
+    print("{:<45} {:>10.2f} us".format(name, seconds / count * 1e6))
+
+
+def bench_find_path_to_edge(number=20):
+    game_state = make_turn_20_state()
+    starts = friendly_edge_locations(game_state)
+
+    def run():
+        for location in starts:
+            game_state.find_path_to_edge(location)
+
+    report("find_path_to_edge, cached path (per query)", min(timeit.repeat(run, number=number, repeat=3)), number * len(starts))
+
+    def run_warm():
+        forget_paths(game_state)
+        run()
+
+    report("find_path_to_edge (per query)", min(timeit.repeat(run_warm, number=number, repeat=3)), number * len(starts))
+
+    def run_cold():
+        ShortestPathFinder.clear_cache()
+        run_warm()
+
+    report("find_path_to_edge, new board (per query)", min(timeit.repeat(run_cold, number=number, repeat=3)), number * len(starts))
+
+
+def bench_find_paths_from_edges(number=20):
+    game_state = make_turn_20_state()
+    count = len(friendly_edge_locations(game_state))
+
+    def run():
+        ShortestPathFinder.clear_cache()
+        forget_paths(game_state)
+        game_state.find_paths_from_edges()
+
+    report("find_paths_from_edges, new board (per path)", min(timeit.repeat(run, number=number, repeat=3)), number * count)
+
+
+def bench_neighbor_expansion(number=50):
+    game_state = make_turn_20_state()
+    game_map = game_state.game_map
+    finder = game_state._shortest_path_finder
+    locations = [location for location in game_map]
+
+    def run_bounds_check():
+        for location in locations:
+            for neighbor in finder._get_neighbors(location):
+                game_map.in_arena_bounds(neighbor)
+
+    def run_table():
+        for location in locations:
+            for index in NEIGHBORS[cell_index(location)]:
+                pass
+
+    report("neighbours via in_arena_bounds (per cell)", min(timeit.repeat(run_bounds_check, number=number, repeat=3)), number * len(locations))
+    report("neighbours via NEIGHBORS table (per cell)", min(timeit.repeat(run_table, number=number, repeat=3)), number * len(locations))
+
+
+def bench_edge_search(number=200):
+    game_state = make_turn_20_state()
+    finder = game_state._shortest_path_finder
+    finder.initialize_map(game_state)
+    edge = game_state.game_map.get_edge_locations(game_state.game_map.TOP_RIGHT)
+
+    def run():
+        finder._validate(edge[0], edge)
+
+    report("distance field search (per BFS)", min(timeit.repeat(run, number=number, repeat=3)), number)
+
+
+def bench_structure_destroyed(number=5):
+    game_state = make_turn_20_state()
+    game_map = game_state.game_map
+    wall = game_state.config["unitInformation"][0]["shorthand"]
+
+    def run():
+        # Destroy each wall in turn and re-path, as the action phase simulation does
+        elapsed = 0
+        for location in WALLS:
+            ShortestPathFinder.clear_cache()
+            game_state.find_path_to_edge([13, 0])
+            game_map.remove_unit(location)
+            start = timeit.default_timer()
+            game_state.find_path_to_edge([13, 0])
+            elapsed += timeit.default_timer() - start
+            game_map.add_unit(wall, location, 0)
+        return elapsed
+
+    repair_limit = ShortestPathFinder.REPAIR_LIMIT
+    for limit, name in [(0, "full search"), (repair_limit, "repaired")]:
+        ShortestPathFinder.REPAIR_LIMIT = limit
+        report("re-path after a wall dies, {}".format(name), min(sum(run() for _ in range(number)) for _ in range(3)), number * len(WALLS))
+    ShortestPathFinder.REPAIR_LIMIT = repair_limit
+
+
+def bench_batch_edge_fields(number=20):
+    if np is None:
+        print("batched distance fields skipped, NumPy is not installed")
+        return
+    game_state = make_turn_20_state()
+    finder = game_state._shortest_path_finder
+    edge = game_state.game_map.get_edge_locations(game_state.game_map.TOP_RIGHT)
+    # Ten candidate layouts, each with a different wall taken out
+    masks = [game_state.game_map.structure_mask & ~(1 << cell_index(location)) for location in WALLS[:10]]
+
+    def run_bfs():
+        for mask in masks:
+            finder.blocked = _blocked_from_mask(mask)
+            finder._validate(edge[0], edge)
+
+    def run_batch():
+        ShortestPathFinder.clear_cache()
+        finder.batch_edge_fields(masks, edge)
+
+    report("distance fields, one BFS each (per layout)", min(timeit.repeat(run_bfs, number=number, repeat=3)), number * len(masks))
+    report("distance fields, batched NumPy (per layout)", min(timeit.repeat(run_batch, number=number, repeat=3)), number * len(masks))
+
+
+def bench_fork(number=50):
+    game_state = make_turn_20_state()
+    wall = game_state.config["unitInformation"][0]["shorthand"]
+
+    def try_out(copy_state):
+        # What a planner does with each candidate: toggle a few walls and ask for a path
+        def run():
+            planned_state = copy_state(game_state)
+            for location in [[5, 11], [13, 11], [7, 8]]:
+                planned_state.game_map.add_unit(wall, location, 0)
+            planned_state.find_path_to_edge([13, 0])
+        return run
+
+    report("copy.deepcopy(game_state)", min(timeit.repeat(lambda: copy.deepcopy(game_state), number=number, repeat=3)), number)
+    report("game_state.fork()", min(timeit.repeat(game_state.fork, number=number, repeat=3)), number)
+    report("candidate plan on a deepcopy", min(timeit.repeat(try_out(copy.deepcopy), number=number, repeat=3)), number)
+    report("candidate plan on a fork", min(timeit.repeat(try_out(GameState.fork), number=number, repeat=3)), number)
+    report("game_state.overlay()", min(timeit.repeat(game_state.overlay, number=number, repeat=3)), number)
+    report("candidate plan on an overlay", min(timeit.repeat(try_out(GameState.overlay), number=number, repeat=3)), number)
+
+
+def bench_board_queries(number=5):
+    game_state = make_turn_20_state()
+    locations = [location for location in game_state.game_map]
+
+    def run_attackers():
+        for location in locations:
+            game_state.get_attackers(location, 0)
+
+    def run_stationary():
+        for location in locations:
+            game_state.contains_stationary_unit(location)
+
+    report("get_attackers (per cell)", min(timeit.repeat(run_attackers, number=number, repeat=3)), number * len(locations))
+    report("contains_stationary_unit (per cell)", min(timeit.repeat(run_stationary, number=number * 10, repeat=3)), number * 10 * len(locations))
+
+
+def bench_least_damage_spawn_location(number=5):
+    game_state = make_turn_20_state()
+    starts = friendly_edge_locations(game_state)
+    turret_damage = game_state.config["unitInformation"][2]["attackDamageWalker"]
+
+    def run():
+        # The starter algo's least_damage_spawn_location, with paths already cached
+        damages = []
+        for location in starts:
+            path = game_state.find_path_to_edge(location)
+            damage = 0
+            for path_location in path:
+                damage += len(game_state.get_attackers(path_location, 0)) * turret_damage
+            damages.append(damage)
+        return starts[damages.index(min(damages))]
+
+    def run_threat_map():
+        damages = [game_state.get_path_damage(game_state.find_path_to_edge(location), 0) for location in starts]
+        return starts[damages.index(min(damages))]
+
+    def run_new_threat_map():
+        game_state._threat_maps = [None, None]
+        return run_threat_map()
+
+    run()
+    report("least_damage_spawn_location", min(timeit.repeat(run, number=number, repeat=3)), number)
+    report("least_damage_spawn_location, threat map", min(timeit.repeat(run_threat_map, number=number, repeat=3)), number)
+    report("least_damage_spawn_location, new threat map", min(timeit.repeat(run_new_threat_map, number=number, repeat=3)), number)
+
+
+def bench_get_targets(number=20):
+    game_state = make_turn_20_state()
+    game_map = game_state.game_map
+    # Both sides' structures plus a few stacks of mobile units in the middle of the board
+    for location, player_index in [([13, 12], 0), ([14, 12], 0), ([10, 13], 0), ([13, 15], 1), ([17, 14], 1)]:
+        for unit_type in ["PI", "PI", "EI"]:
+            game_map.add_unit(unit_type, location, player_index)
+    attackers = [unit for location in game_map for unit in game_map[location] if unit.damage_i + unit.damage_f > 0]
+
+    def run_one_by_one():
+        return [game_state.get_target(unit) for unit in attackers]
+
+    def run_batched():
+        return game_state.get_targets(attackers)
+
+    report("get_target, one call per attacker", min(timeit.repeat(run_one_by_one, number=number, repeat=3)), number * len(attackers))
+    report("get_targets, batched (per attacker)", min(timeit.repeat(run_batched, number=number, repeat=3)), number * len(attackers))
+
+
+def bench_count_structures(number=20):
+    game_state = make_turn_20_state()
+    game_map = game_state.game_map
+    turret = game_state.config["unitInformation"][2]["shorthand"]
+
+    def run_scan():
+        # The cell by cell count the starter algo's detect_enemy_unit does
+        total_units = 0
+        for location in game_map:
+            if game_state.contains_stationary_unit(location):
+                for unit in game_map[location]:
+                    if unit.player_index == 1 and unit.unit_type == turret and location[1] in [14, 15]:
+                        total_units += 1
+        return total_units
+
+    def run_bitboard():
+        return game_map.count_structures(1, turret, valid_y=[14, 15])
+
+    report("count enemy turrets, cell scan", min(timeit.repeat(run_scan, number=number, repeat=3)), number)
+    report("count enemy turrets, bitboards", min(timeit.repeat(run_bitboard, number=number, repeat=3)), number)
+
+
+def bench_arena_iteration(number=50):
+    game_state = make_turn_20_state()
+    game_map = game_state.game_map
+
+    def run_scan():
+        # Visiting every cell to find the enemy structures
+        return [location for location in game_map if game_map[location] and game_map[location][0].player_index == 1]
+
+    def run_generator():
+        return list(game_map.structure_locations(1))
+
+    report("iterate the arena (per pass)", min(timeit.repeat(lambda: list(game_map), number=number, repeat=3)), number)
+    report("enemy structure locations, cell scan", min(timeit.repeat(run_scan, number=number, repeat=3)), number)
+    report("enemy structure locations, bitboard", min(timeit.repeat(run_generator, number=number, repeat=3)), number)
+
+
+def bench_turn_parsing():
+    config = json.loads(TEST_CONFIG)
+    turn_strings = make_game_turns()
+
+    def run_full():
+        for turn_string in turn_strings:
+            GameState(config, turn_string)
+
+    def run_incremental():
+        game_state = GameState(config, turn_strings[0])
+        for turn_string in turn_strings[1:]:
+            game_state = game_state.next_turn(turn_string)
+
+    report("parse a turn from scratch (100 turn game)", min(timeit.repeat(run_full, number=1, repeat=3)), len(turn_strings))
+    report("parse a turn from the last one (100 turn game)", min(timeit.repeat(run_incremental, number=1, repeat=3)), len(turn_strings))
+
+
+def bench_action_frames(frames=300):
+    # A late game frame with both boards full and a few units in flight, most frames have no breach, spawn or attack
+    frame = json.loads(make_turn_20_state().serialized_string)
+    frame["turnInfo"] = [1, 20, 0, 0]
+    frame["p1Units"][3] = [[13, 4, 15.0, "901"], [13, 4, 15.0, "902"]]
+    frame_string = json.dumps(frame)
+
+    class Strategy(AlgoCore):
+        def on_action_frame(self, action_frame):
+            action_frame.events["breach"]
+
+    def run_parse_twice():
+        # What the loop and on_action_frame each did before
+        for _ in range(frames):
+            if int(json.loads(frame_string)["turnInfo"][0]) == 1:
+                json.loads(frame_string)["events"]["breach"]
+
+    strategy = Strategy()
+
+    def run(events):
+        strategy.ACTION_FRAME_EVENTS = events
+        for _ in range(frames):
+            strategy._handle_message(frame_string)
+
+    report("action frame, parsed twice", min(timeit.repeat(run_parse_twice, number=1, repeat=3)), frames)
+    report("action frame, parsed once", min(timeit.repeat(lambda: run(None), number=1, repeat=3)), frames)
+    report("action frame, skipped by its events", min(timeit.repeat(lambda: run(["breach", "spawn"]), number=1, repeat=3)), frames)
+
+
+def bench_debug_write(messages=2000):
+    # A message like the ones written for every new best defence plan, flushed once per 100 like once per turn
+    plan = {"expected_utility": 0.25, "front_hole": [13, 11], "back_hole": [7, 9], "interceptor_loc": [7, 6], "interceptor_num": 1}
+
+    def run(level):
+        for i in range(messages):
+            debug_write("turn", 20, "new best plan", plan, level=level)
+            if i % 100 == 99:
+                flush_debug()
+
+    # The engine reads stderr through a pipe, so every flush is a write to it
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        while os.read(read_fd, 65536):
+            pass
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    stderr = sys.stderr
+    with open(write_fd, "w") as pipe:
+        sys.stderr = pipe
+        try:
+            set_debug_output(level=INFO, buffered=False, max_per_turn=None)
+            report("debug_write, written and flushed each", min(timeit.repeat(lambda: run(INFO), number=1, repeat=3)), messages)
+            set_debug_output(buffered=True)
+            report("debug_write, buffered per turn", min(timeit.repeat(lambda: run(INFO), number=1, repeat=3)), messages)
+            report("debug_write, below the level", min(timeit.repeat(lambda: run(DEBUG), number=1, repeat=3)), messages)
+        finally:
+            set_debug_output(level=INFO, buffered=True, max_per_turn=None)
+            sys.stderr = stderr
+    reader.join()
+    os.close(read_fd)
+
+
+def bench_unit_construction(number=20000):
+    game_state = make_turn_20_state()
+    config = game_state.config
+    turret = config["unitInformation"][2]["shorthand"]
+
+    def run():
+        for _ in range(number):
+            GameUnit(turret, config, 0, None, 13, 10)
+
+    report("GameUnit construction (per unit)", min(timeit.repeat(run, number=1, repeat=3)), number)
+
+
+def main():
+    bench_find_path_to_edge()
+    bench_find_paths_from_edges()
+    bench_neighbor_expansion()
+    bench_edge_search()
+    bench_structure_destroyed()
+    bench_batch_edge_fields()
+    bench_fork()
+    bench_board_queries()
+    bench_least_damage_spawn_location()
+    bench_get_targets()
+    bench_unit_construction()
+    bench_turn_parsing()
+    bench_action_frames()
+    bench_count_structures()
+    bench_arena_iteration()
+    bench_debug_write()
+
+
+if __name__ == "__main__":
+    main()
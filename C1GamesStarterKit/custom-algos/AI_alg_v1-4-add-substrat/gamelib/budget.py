@@ -0,0 +1,80 @@
+import time
+from contextlib import contextmanager
+
+
+class TurnBudget:
+    """Keeps track of the time left to submit a turn, so searches can stop with the best plan found so far
+    instead of running past the engine's time limit.
+
+    The engine slowly takes health away once a turn takes longer than waitTimeBotSoft,
+    and ends the game past waitTimeBotMax. A budget made by for_config ends SAFETY_MARGIN
+    seconds before the soft limit.
+
+    Attributes :
+        * limit (float): The seconds the turn may take
+        * start (float): When the turn began, as read from clock
+        * phases (dict): The seconds spent in each phase timed with phase(), by name
+
+    """
+    SAFETY_MARGIN = 0.5
+    DEFAULT_SOFT_LIMIT = 5000
+
+    def __init__(self, limit, clock=time.perf_counter):
+        """Starts the budget of a turn
+
+        Args:
+            limit: The seconds the turn may take, float("inf") for no limit
+            clock: The function giving the current time in seconds
+        """
+        self.limit = limit
+        self.clock = clock
+        self.start = clock()
+        self.deadline = self.start + limit
+        self.phases = {}
+
+    @classmethod
+    def for_config(cls, config):
+        """Starts the budget of a turn from the engine's soft time limit
+
+        Args:
+            config: Contains information about the game
+
+        Returns:
+            A TurnBudget ending SAFETY_MARGIN seconds before the soft limit
+        """
+        soft_limit = (config or {}).get("timingAndReplay", {}).get("waitTimeBotSoft", cls.DEFAULT_SOFT_LIMIT)
+        return cls(max(soft_limit / 1000 - cls.SAFETY_MARGIN, 0))
+
+    def elapsed(self):
+        """The seconds since the turn began"""
+        return self.clock() - self.start
+
+    def remaining(self):
+        """The seconds left before the limit, never below 0"""
+        return max(self.deadline - self.clock(), 0)
+
+    def expired(self):
+        """True once the limit is reached. Cheap enough to call on every iteration of a search loop"""
+        return self.clock() >= self.deadline
+
+    @contextmanager
+    def phase(self, name):
+        """Times the code run inside a with block, adding it to phases[name]
+
+        Args:
+            name: The name of the phase, such as "parse" or "defence"
+        """
+        start = self.clock()
+        try:
+            yield self
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + self.clock() - start
+
+    def report(self):
+        """A one line summary of the turn's timings, for debug_write
+
+        Returns:
+            The time spent in each phase and in total, in milliseconds
+        """
+        timings = ", ".join("{} {:.1f} ms".format(name, seconds * 1000) for name, seconds in self.phases.items())
+        return "Turn took {:.1f} of {:.1f} ms ({})".format(self.elapsed() * 1000, self.limit * 1000, timings)
@@ -1,6 +1,218 @@
+import copy
 import math
+from array import array
 from .unit import GameUnit
-from .util import debug_write
+from .util import debug_write, WARNING
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+CELL_COUNT = ARENA_SIZE * ARENA_SIZE
+
+
+def cell_index(location):
+    """Index of a location in the flat per-cell tables
+
+    Args:
+        location: A map location, [x, y]
+
+    Returns:
+        x * ARENA_SIZE + y
+    """
+    return location[0] * ARENA_SIZE + location[1]
+
+
+def _build_topology():
+    """Computes the static tables describing the diamond shaped arena
+    """
+    valid = bytearray(CELL_COUNT)
+    for y in range(ARENA_SIZE):
+        row_size = y + 1 if y < HALF_ARENA else ARENA_SIZE - y
+        for x in range(HALF_ARENA - row_size, HALF_ARENA + row_size):
+            valid[cell_index([x, y])] = 1
+
+    locations = tuple((index // ARENA_SIZE, index % ARENA_SIZE) for index in range(CELL_COUNT))
+    neighbors = []
+    for x, y in locations:
+        candidates = [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
+        neighbors.append(tuple(cell_index(n) for n in candidates
+                               if 0 <= n[0] < ARENA_SIZE and 0 <= n[1] < ARENA_SIZE and valid[cell_index(n)]))
+
+    top_right = tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    top_left = tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    bottom_left = tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA))
+    bottom_right = tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA))
+    return valid, locations, tuple(neighbors), (top_right, top_left, bottom_left, bottom_right)
+
+"""
+Static arena topology, built once at import and shared by GameMap, GameState and ShortestPathFinder.
+All tables are indexed with cell_index.
+    * VALID_CELLS (bytearray): 1 for every cell inside the diamond
+    * CELL_LOCATIONS (tuple): The (x, y) location of every cell index
+    * NEIGHBORS (tuple): The in arena neighbours of every cell, up, down, right then left
+    * EDGE_LOCATIONS (tuple): The (x, y) locations of each edge, in the order of GameMap.get_edges
+    * EDGE_CELLS (tuple): The cell indices of each edge as frozensets
+    * FRIENDLY_EDGE_CELLS (frozenset): The cell indices of the BOTTOM_LEFT and BOTTOM_RIGHT edges
+"""
+VALID_CELLS, CELL_LOCATIONS, NEIGHBORS, EDGE_LOCATIONS = _build_topology()
+EDGE_CELLS = tuple(frozenset(cell_index(location) for location in edge) for edge in EDGE_LOCATIONS)
+FRIENDLY_EDGE_CELLS = EDGE_CELLS[2] | EDGE_CELLS[3]
+
+"""
+Every arena location as an (x, y) tuple, row by row from the bottom as GameMap iterates them,
+and the same locations split by half, indexed with player_index, and by quadrant, in the order of GameMap.get_edges
+"""
+ARENA_LOCATIONS = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ARENA_SIZE) if VALID_CELLS[cell_index([x, y])])
+HALF_LOCATIONS = (tuple(location for location in ARENA_LOCATIONS if location[1] < HALF_ARENA),
+                  tuple(location for location in ARENA_LOCATIONS if location[1] >= HALF_ARENA))
+QUADRANT_LOCATIONS = tuple(tuple(location for location in ARENA_LOCATIONS if (location[0] >= HALF_ARENA) == right and (location[1] >= HALF_ARENA) == top)
+                           for right, top in [(True, True), (False, True), (False, False), (True, False)])
+
+"""
+Bitboards with every cell of a column or a row set, indexed with x and y respectively
+"""
+COLUMN_MASKS = tuple(((1 << ARENA_SIZE) - 1) << (x * ARENA_SIZE) for x in range(ARENA_SIZE))
+ROW_MASKS = tuple(sum(1 << cell_index([x, y]) for x in range(ARENA_SIZE)) for y in range(ARENA_SIZE))
+
+"""
+The cells in range of every arena cell for each radius asked for so far, keyed by (radius, hit radius).
+Shared by every GameMap, see range_table
+"""
+_RANGE_TABLES = {}
+
+
+def range_table(radius, hit_radius):
+    """Gets the cells whose centers are within radius + hit_radius of each arena cell, built the first time it is asked for
+
+    Args:
+        radius: An attack or shield range
+        hit_radius: The getHitRadius of the config
+
+    Returns:
+        Two tuples indexed with cell_index, holding for each arena cell the cell indices in range, 
+        in the order get_locations_in_range returns them, and their distances to the cell. Empty outside the arena
+    """
+    key = (radius, hit_radius)
+    table = _RANGE_TABLES.get(key)
+    if table is None:
+        search_radius = math.ceil(radius)
+        offsets = [(dx, dy, math.sqrt(dx ** 2 + dy ** 2)) for dx in range(-search_radius, search_radius + 1)
+                   for dy in range(-search_radius, search_radius + 1) if math.sqrt(dx ** 2 + dy ** 2) < radius + hit_radius]
+        cells = [()] * CELL_COUNT
+        distances = [()] * CELL_COUNT
+        for x, y in ARENA_LOCATIONS:
+            in_range = [(cell_index([x + dx, y + dy]), distance) for dx, dy, distance in offsets
+                        if 0 <= x + dx < ARENA_SIZE and 0 <= y + dy < ARENA_SIZE and VALID_CELLS[cell_index([x + dx, y + dy])]]
+            cells[cell_index([x, y])] = tuple(index for index, _ in in_range)
+            distances[cell_index([x, y])] = tuple(distance for _, distance in in_range)
+        table = _RANGE_TABLES[key] = (tuple(cells), tuple(distances))
+    return table
+
+
+def config_ranges(config):
+    """Every attack and shield range in a config, upgraded or not
+
+    Args:
+        config: Contains information about the game
+
+    Returns:
+        The distinct ranges, as a sorted list
+    """
+    ranges = set()
+    for unit in config["unitInformation"]:
+        for name in ["attackRange", "shieldRange"]:
+            for stats in [unit, unit.get("upgrade", {})]:
+                if name in stats:
+                    ranges.add(stats[name])
+    return sorted(ranges)
+
+
+class UnitArrays:
+    """Structure of arrays copy of the units on a GameMap, for board wide queries without walking GameUnits.
+    Every array is indexed with cell_index.
+
+    Attributes :
+        * structure_owner (array): The player index of the structure on each cell, -1 where there is none
+        * structure_type (array): The unit type index of the structure on each cell, as in config["unitInformation"], -1 where there is none
+        * structure_health (array): The health of the structure on each cell
+        * structure_upgraded (bytearray): 1 where the structure is upgraded
+        * structure_pending_removal (bytearray): 1 where the structure is marked for removal
+        * mobile_counts (array): How many mobile units of each player and type stand on each cell,
+          at (player_index * MOBILE_TYPES + type_index - MOBILE_TYPES) * CELL_COUNT + cell_index
+        * mobile_masks (list): For each player index, a bitboard with bit cell_index set where that player has mobile units
+
+    """
+    MOBILE_TYPES = 3
+
+    def __init__(self, config):
+        self.type_index = {unit["shorthand"]: index for index, unit in enumerate(config["unitInformation"]) if "shorthand" in unit}
+        self.structure_owner = array('b', [-1]) * CELL_COUNT
+        self.structure_type = array('b', [-1]) * CELL_COUNT
+        self.structure_health = array('d', [0.0]) * CELL_COUNT
+        self.structure_upgraded = bytearray(CELL_COUNT)
+        self.structure_pending_removal = bytearray(CELL_COUNT)
+        self.mobile_counts = array('H', [0]) * (2 * self.MOBILE_TYPES * CELL_COUNT)
+        self.mobile_masks = [0, 0]
+
+    def copy(self):
+        arrays = copy.copy(self)
+        for name in ["structure_owner", "structure_type", "structure_health", "structure_upgraded", "structure_pending_removal", "mobile_counts", "mobile_masks"]:
+            setattr(arrays, name, getattr(self, name)[:])
+        return arrays
+
+    def mobile_count(self, location, player_index, unit_type):
+        """The number of mobile units of a player and type at a location
+        """
+        return self.mobile_counts[self.__mobile_slot(player_index, self.type_index[unit_type]) + cell_index(location)]
+
+    def add_mobile(self, index, unit):
+        if unit.player_index in (0, 1):
+            self.mobile_counts[self.__mobile_slot(unit.player_index, self.type_index[unit.unit_type]) + index] += 1
+            self.mobile_masks[unit.player_index] |= 1 << index
+
+    def set_cell(self, index, units):
+        """Rewrites the entries of a cell from its unit list
+        """
+        self.structure_owner[index] = -1
+        self.structure_type[index] = -1
+        self.structure_health[index] = 0.0
+        self.structure_upgraded[index] = 0
+        self.structure_pending_removal[index] = 0
+        for slot in range(index, len(self.mobile_counts), CELL_COUNT):
+            self.mobile_counts[slot] = 0
+        self.mobile_masks = [mask & ~(1 << index) for mask in self.mobile_masks]
+        for unit in units:
+            if unit.stationary:
+                self.structure_owner[index] = unit.player_index
+                self.structure_type[index] = self.type_index[unit.unit_type]
+                self.structure_health[index] = unit.health
+                self.structure_upgraded[index] = unit.upgraded
+                self.structure_pending_removal[index] = unit.pending_removal
+            else:
+                self.add_mobile(index, unit)
+
+    def numpy_views(self):
+        """NumPy arrays sharing memory with these arrays, shaped (28, 28) and indexed [x, y].
+        mobile_counts is shaped (2, 3, 28, 28) and indexed [player_index, type_index - 3, x, y]. Requires NumPy
+
+        Returns:
+            A dict mapping each attribute name to its view
+        """
+        if np is None:
+            raise ImportError("numpy_views requires NumPy")
+        views = {}
+        for name in ["structure_owner", "structure_type", "structure_health", "structure_upgraded", "structure_pending_removal"]:
+            views[name] = np.frombuffer(getattr(self, name), dtype=np.float64 if name == "structure_health" else np.int8).reshape(ARENA_SIZE, ARENA_SIZE)
+        views["mobile_counts"] = np.frombuffer(self.mobile_counts, dtype=np.uint16).reshape(2, self.MOBILE_TYPES, ARENA_SIZE, ARENA_SIZE)
+        return views
+
+    def __mobile_slot(self, player_index, type_index):
+        return (player_index * self.MOBILE_TYPES + type_index - self.MOBILE_TYPES) * CELL_COUNT
+
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -18,6 +230,15 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * structure_mask (int): Bit x * ARENA_SIZE + y is set when a structure stands at [x, y]. 
+          Kept up to date by add_unit, remove_unit and assignment, not by editing the lists returned by game_map[x, y].
+        * structure_boards (list): The same kind of bitboard for each player and structure type, indexed
+          [player_index][type_index] with the type index of config["unitInformation"]. structure_mask is their union
+        * version (int): Goes up by one every time structure_mask changes, so results computed for a board can be
+          recognised as stale
+        * unit_arrays (:obj: UnitArrays): The units as flat arrays, kept up to date like structure_mask.
+          Call refresh_cell after changing units or unit lists in place
+        * hit_radius (float): The getHitRadius of the config, added to every range
 
     """
     def __init__(self, config):
@@ -29,43 +250,89 @@ class GameMap:
         """
         self.config = config
         self.enable_warnings = True
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+        self.ARENA_SIZE = ARENA_SIZE
+        self.HALF_ARENA = HALF_ARENA
         self.TOP_RIGHT = 0
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.structure_mask = 0
+        self.structure_boards = [[0] * len(config["unitInformation"]) for _ in range(2)]
+        self.version = 0
+        self.unit_arrays = UnitArrays(config)
+        self._unit_arrays_shared = False
+        self.__owned = bytearray(b'\x01') * CELL_COUNT
+        self.hit_radius = config["unitInformation"][0]['getHitRadius']
+        for radius in config_ranges(config):
+            range_table(radius, self.hit_radius)
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
-            return self.__map[x][y]
+            return self._get_cell(x, y)
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            self._set_cell(location[0], location[1], val)
+            self.__update_structures(location, next((unit for unit in val if unit.stationary), None))
+            self.__writable_unit_arrays().set_cell(cell_index(location), val)
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        return ([x, y] for x, y in ARENA_LOCATIONS)
+
+    def get_half_locations(self, player_index):
+        """Gets every location on one player's half of the arena
+
+        Args:
+            player_index: 0 for your half, 1 for your opponent's
+
+        Returns:
+            The locations as [x, y] lists
+        """
+        return [[x, y] for x, y in HALF_LOCATIONS[player_index]]
+
+    def get_quadrant_locations(self, quadrant_description):
+        """Gets every location in one quadrant of the arena
+
+        Args:
+            quadrant_description: The quadrant, named like its edge. TOP_LEFT, BOTTOM_RIGHT, etc.
+
+        Returns:
+            The locations as [x, y] lists
+        """
+        return [[x, y] for x, y in QUADRANT_LOCATIONS[quadrant_description]]
+
+    def structure_locations(self, player_index=None, unit_type=None):
+        """Generates the locations of some of the structures, read from the bitboards, in cell_index order
+
+        Args:
+            player_index: The owner of the structures, either player if None
+            unit_type: The type of the structures, every type if None
+
+        Yields:
+            The [x, y] location of each structure
+        """
+        board = self.structure_bitboard(player_index, unit_type)
+        while board:
+            lowest = board & -board
+            yield list(CELL_LOCATIONS[lowest.bit_length() - 1])
+            board ^= lowest
+
+    def unit_locations(self):
+        """Generates the locations holding at least one unit, read from the bitboards, in cell_index order
+
+        Yields:
+            The [x, y] location of each occupied cell
+        """
+        board = self.structure_mask | self.unit_arrays.mobile_masks[0] | self.unit_arrays.mobile_masks[1]
+        while board:
+            lowest = board & -board
+            yield list(CELL_LOCATIONS[lowest.bit_length() - 1])
+            board ^= lowest
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +342,123 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def _shared_attributes(self):
+        """The attributes a map built on top of this one starts with, everything but its own grid of cells
+        """
+        return {name: value for name, value in vars(self).items() if not name.startswith("_GameMap__")}
+
+    def fork(self):
+        """Copies the map without copying its units.
+        Both maps share every cell until one of them reads or changes it, at which point that map
+        takes its own copy of the cell's unit list and units
+
+        Returns:
+            A GameMap that can be changed without affecting this one
+        """
+        game_map = copy.copy(self)
+        game_map.__map = [column[:] for column in self.__map]
+        game_map.__owned = bytearray(CELL_COUNT)
+        self.__owned = bytearray(CELL_COUNT)
+        game_map.structure_boards = [boards[:] for boards in self.structure_boards]
+        game_map._unit_arrays_shared = self._unit_arrays_shared = True
+        return game_map
+
+    def overlay(self):
+        """Starts a hypothetical version of this map without copying anything, see GameMapOverlay
+
+        Returns:
+            A GameMapOverlay on top of this map
+        """
+        return GameMapOverlay(self)
+
+    def refresh_cell(self, location):
+        """Brings unit_arrays up to date with the units at a location, after they were changed in place
+
+        Args:
+            location: The location whose units changed
+        """
+        x, y = location
+        self.__writable_unit_arrays().set_cell(cell_index(location), self._get_cell(x, y))
+
+    def __writable_unit_arrays(self):
+        if self._unit_arrays_shared:
+            self.unit_arrays = self.unit_arrays.copy()
+            self._unit_arrays_shared = False
+        return self.unit_arrays
+
+    def _get_cell(self, x, y):
+        """The unit list at [x, y], taking this map's own copy of it first if it is shared with a fork
+        """
+        if not self.__owned[x * ARENA_SIZE + y]:
+            self.__map[x][y] = [copy.copy(unit) for unit in self.__map[x][y]]
+            self.__owned[x * ARENA_SIZE + y] = 1
+        return self.__map[x][y]
+
+    def _set_cell(self, x, y, units):
+        """Replaces the unit list at [x, y]
+        """
+        self.__map[x][y] = units
+        self.__owned[x * ARENA_SIZE + y] = 1
+
+    def __update_structures(self, location, structure):
+        """Updates the bitboards after the structure at a location changed
+
+        Args:
+            location: The location that changed
+            structure: The GameUnit now standing there, None if there is no structure
+        """
+        bit = 1 << cell_index(location)
+        if self.structure_mask & bit:
+            for boards in self.structure_boards:
+                for type_index, board in enumerate(boards):
+                    if board & bit:
+                        boards[type_index] = board & ~bit
+        if structure is not None and structure.player_index in (0, 1):
+            self.structure_boards[structure.player_index][structure.stats.type_index] |= bit
+        mask = self.structure_mask | bit if structure is not None else self.structure_mask & ~bit
+        if mask != self.structure_mask:
+            self.structure_mask = mask
+            self.version += 1
+
+    def structure_bitboard(self, player_index=None, unit_type=None):
+        """Gets the bitboard of some of the structures, bit x * ARENA_SIZE + y is set for each of them
+
+        Args:
+            player_index: The owner of the structures, either player if None
+            unit_type: The type of the structures, every type if None
+
+        Returns:
+            The bitboard as an int
+        """
+        players = [0, 1] if player_index is None else [player_index]
+        board = 0
+        for player in players:
+            if unit_type is None:
+                for type_board in self.structure_boards[player]:
+                    board |= type_board
+            else:
+                board |= self.structure_boards[player][self.unit_arrays.type_index[unit_type]]
+        return board
+
+    def count_structures(self, player_index=None, unit_type=None, valid_x=None, valid_y=None):
+        """Counts structures with bitboard operations instead of looking at every cell
+
+        Args:
+            player_index: The owner of the structures, either player if None
+            unit_type: The type of the structures, every type if None
+            valid_x: Only count structures whose x is in this list, any x if None
+            valid_y: Only count structures whose y is in this list, any y if None
+
+        Returns:
+            The number of structures matching every filter
+        """
+        board = self.structure_bitboard(player_index, unit_type)
+        if valid_x is not None:
+            board &= sum(COLUMN_MASKS[x] for x in set(valid_x))
+        if valid_y is not None:
+            board &= sum(ROW_MASKS[y] for y in set(valid_y))
+        return bin(board).count("1")
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +473,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and VALID_CELLS[x * ARENA_SIZE + y] == 1
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -117,8 +489,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [[x, y] for x, y in EDGE_LOCATIONS[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,35 +498,16 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[[x, y] for x, y in edge] for edge in EDGE_LOCATIONS]
     
-    def add_unit(self, unit_type, location, player_index=0):
+    def add_unit(self, unit_type, location, player_index=0, health=None):
         """Add a single GameUnit to the map at the given location.
 
         Args:
             unit_type: The type of the new unit. Use the constants provided in algo_strategy.
             location: A list of two integers representing the [x,y] coordinate of the new unit
             player_index: The index corresponding to the player controlling the new unit, 0 for you 1 for the enemy
+            health: The health of the new unit, its starting health if None
 
         This function does not affect your turn and only changes the data stored in GameMap. The intended use of this function
         is to allow you to create arbitrary gamestates. Using this function on the game_map provided with game_state will 
@@ -167,11 +519,14 @@ class GameMap:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
         x, y = location
-        new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        new_unit = GameUnit(unit_type, self.config, player_index, health, location[0], location[1])
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            self._get_cell(x, y).append(new_unit)
+            self.__writable_unit_arrays().add_mobile(cell_index(location), new_unit)
         else:
-            self.__map[x][y] = [new_unit]
+            self._set_cell(x, y, [new_unit])
+            self.__update_structures(location, new_unit)
+            self.__writable_unit_arrays().set_cell(cell_index(location), [new_unit])
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +541,9 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
-        self.__map[x][y] = []
+        self._set_cell(x, y, [])
+        self.__update_structures(location, None)
+        self.__writable_unit_arrays().set_cell(cell_index(location), [])
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -201,21 +558,39 @@ class GameMap:
         """
         if radius < 0 or radius > self.ARENA_SIZE:
             self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
-        if not self.in_arena_bounds(location):
-            self._invalid_coordinates(location)
+        if self.in_arena_bounds(location):
+            return [[index // ARENA_SIZE, index % ARENA_SIZE] for index in range_table(radius, self.hit_radius)[0][cell_index(location)]]
+        self._invalid_coordinates(location)
 
         x, y = location
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
                 # A unit with a given range affects all locations whose centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
+                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + self.hit_radius:
                     locations.append(new_location)
         return locations
 
+    def get_cells_in_range(self, location, radius):
+        """Gets the cell indices in a circular area around a location, without building location lists
+
+        Args:
+            location: The center of our search area
+            radius: The radius of our search area
+
+        Returns:
+            The cell indices within our search area and their distances to location, as two tuples in the order of get_locations_in_range
+
+        """
+        if self.in_arena_bounds(location) and 0 <= radius <= self.ARENA_SIZE:
+            cells, distances = range_table(radius, self.hit_radius)
+            index = cell_index(location)
+            return cells[index], distances[index]
+        locations = self.get_locations_in_range(location, radius)
+        return tuple(cell_index(new_location) for new_location in locations), tuple(self.distance_between_locations(location, new_location) for new_location in locations)
+
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
 
@@ -237,4 +612,52 @@ class GameMap:
         Used internally by game_map to print out default messaging
         """
         if(self.enable_warnings):
-            debug_write(message)
+            debug_write(message, level=WARNING)
+
+
+class GameMapOverlay(GameMap):
+    """A hypothetical version of a GameMap, for what-if questions such as closing one hole and opening another.
+    It records the cells it changes and reads every other cell through to the base map, so creating one
+    copies nothing and costs O(changes) instead of O(board). A cell is copied from the base the first
+    time it is read, so units can be damaged or moved without touching the base. unit_arrays are shared
+    with the base until the first change.
+    The base map should not change while an overlay on top of it is in use.
+
+    Attributes :
+        * base (:obj: GameMap): The map this overlay reads through to
+        * changed_cells (dict): The unit list of every cell this overlay has read or changed, keyed by cell_index
+
+    """
+    def __init__(self, base):
+        """Starts an overlay with no changes
+
+        Args:
+            base (:obj: GameMap): The map to read through to
+
+        """
+        vars(self).update(base._shared_attributes())
+        self.structure_boards = [boards[:] for boards in base.structure_boards]
+        self._unit_arrays_shared = True
+        self.base = base
+        self.changed_cells = {}
+
+    def fork(self):
+        """Copies the overlay, the copy reads through to the same base
+
+        Returns:
+            A GameMapOverlay that can be changed without affecting this one
+        """
+        game_map = copy.copy(self)
+        game_map.changed_cells = {index: [copy.copy(unit) for unit in units] for index, units in self.changed_cells.items()}
+        game_map.structure_boards = [boards[:] for boards in self.structure_boards]
+        game_map._unit_arrays_shared = self._unit_arrays_shared = True
+        return game_map
+
+    def _get_cell(self, x, y):
+        units = self.changed_cells.get(x * ARENA_SIZE + y)
+        if units is None:
+            units = self.changed_cells[x * ARENA_SIZE + y] = [copy.copy(unit) for unit in self.base[x, y]]
+        return units
+
+    def _set_cell(self, x, y, units):
+        self.changed_cells[x * ARENA_SIZE + y] = units
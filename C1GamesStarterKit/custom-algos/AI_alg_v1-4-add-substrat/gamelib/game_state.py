@@ -1,11 +1,14 @@
+import copy
 import math
 import json
 import sys
+from array import array
+from collections import namedtuple
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .util import send_command, debug_write, flush_debug, WARNING
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, CELL_COUNT, CELL_LOCATIONS, FRIENDLY_EDGE_CELLS, cell_index
 
 def is_stationary(unit_type):
     """
@@ -17,6 +20,23 @@ def is_stationary(unit_type):
     """
     return unit_type in STRUCTURE_TYPES
 
+"""
+The damage the enemy structures could deal to a player's units on each cell, see GameState.threat_map.
+Every array is indexed with cell_index.
+    * attackers (array): How many enemy structures can attack the cell
+    * damage_i (array): Their total damage per frame against mobile units
+    * damage_f (array): Their total damage per frame against structures
+"""
+ThreatMap = namedtuple("ThreatMap", ["attackers", "damage_i", "damage_f"])
+
+"""
+The shield a player's supports give to that player's mobile units on each cell, see GameState.shield_map.
+    * shield (array): The total shield of the supports in range of each cell, indexed with cell_index
+    * sources (list): For each cell index, a bitmask of the supports in range, bit k standing for support k
+    * amounts (tuple): The shield given by support k, honouring its upgrade and shieldBonusPerY
+"""
+ShieldMap = namedtuple("ShieldMap", ["shield", "sources", "amounts"])
+
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
@@ -44,6 +64,8 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * path_cache_hits (int): How many paths were served from the path cache, for profiling
+        * path_cache_misses (int): How many paths had to be computed
 
     """
 
@@ -93,15 +115,97 @@ class GameState:
         self._shortest_path_finder = ShortestPathFinder()
         self._build_stack = []
         self._deploy_stack = []
+        self._path_cache = {}
+        self._path_cache_version = None
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+        self._threat_maps = [None, None]
+        self._shield_maps = [None, None]
+        self._max_attack_range = max([0] + [stats.get("attackRange", 0) for unit in config["unitInformation"] for stats in [unit, unit.get("upgrade", {})]])
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
         self.__parse_state(serialized_string)
 
-    def __parse_state(self, state_line):
+    def fork(self):
+        """Copies the game state to try out moves on, much faster than copy.deepcopy.
+        The config and unit type data are shared, the map is copied cell by cell as either state
+        touches it, and the resources and build and deploy stacks are copied
+
+        Returns:
+            A GameState that can be changed without affecting this one
+        """
+        return self.__copy_with_map(self.game_map.fork())
+
+    def overlay(self):
+        """Like fork, but the map of the new state is a GameMapOverlay that only records its own changes.
+        The cheapest way to try out a few structure changes, as long as this state does not change meanwhile
+
+        Returns:
+            A GameState on top of this one
+        """
+        return self.__copy_with_map(self.game_map.overlay())
+
+    def next_turn(self, serialized_string):
+        """Parses the state of a later turn, rebuilding only the cells whose units changed since this state was parsed.
+        The units of the other cells are shared with this state until either state touches them, and the cached
+        paths, threat maps and shield maps are kept when the structures they depend on did not change.
+        Call it on a state as it was parsed and plan on a fork of it, since changes made to this state would carry over
+
+        Args:
+            serialized_string: The game state of the new turn, as passed to __init__
+
+        Returns:
+            A new GameState, the same as GameState(config, serialized_string) would build
+        """
+        game_state = self.__copy_with_map(self.game_map.fork())
+        game_state.serialized_string = serialized_string
+        game_state._build_stack = []
+        game_state._deploy_stack = []
+        game_state.suppress_warnings(False)
+        game_state.__parse_state(serialized_string, self._parsed_cells)
+        return game_state
+
+    def reuse_analysis(self, game_state):
+        """Takes over the paths, threat maps and shield maps another state computed, for instance a guess of
+        this turn's board analysed in the background during the last action phase. Threat and shield maps
+        are taken when they were computed for this board's structures, replacing the ones carried over from
+        last turn. Paths are only taken when both boards have the same structures
+
+        Args:
+            game_state: A GameState whose cached results should be reused
+        """
+        keys = [self.__layout_key(player_index) for player_index in [0, 1]]
+        for player_index in [0, 1]:
+            # A player's threat map depends on the enemy's structures, their shield map on their own
+            for maps, other_maps, key in [(self._threat_maps, game_state._threat_maps, keys[1 - player_index]),
+                                          (self._shield_maps, game_state._shield_maps, keys[player_index])]:
+                other = other_maps[player_index]
+                if other is not None and other[0] == key:
+                    maps[player_index] = other
+        if (game_state.game_map.structure_mask == self.game_map.structure_mask and
+                game_state._path_cache_version == game_state.game_map.version):
+            paths = dict(game_state._path_cache)
+            paths.update(self.__current_path_cache())
+            self._path_cache = paths
+            self._path_cache_version = self.game_map.version
+
+    def __copy_with_map(self, game_map):
+        game_state = copy.copy(self)
+        game_state.game_map = game_map
+        game_state._shortest_path_finder = ShortestPathFinder()
+        game_state._build_stack = self._build_stack[:]
+        game_state._deploy_stack = self._deploy_stack[:]
+        game_state._player_resources = [dict(resources) for resources in self._player_resources]
+        game_state._threat_maps = self._threat_maps[:]
+        game_state._shield_maps = self._shield_maps[:]
+        return game_state
+
+    def __parse_state(self, state_line, previous_cells=None):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
         state_line is the game state as a json string.
+        previous_cells are the parsed cells of the turn the map holds, only the cells that differ from them are rebuilt.
         """
         state = json.loads(state_line)
 
@@ -123,12 +227,24 @@ class GameState:
         p1units = state["p1Units"]
         p2units = state["p2Units"]
 
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
+        self._parsed_cells = {}
+        self.__group_parsed_units(p1units, 0)
+        self.__group_parsed_units(p2units, 1)
 
-    def __create_parsed_units(self, units, player_number):
+        if previous_cells is None:
+            changed_cells = self._parsed_cells.keys()
+        else:
+            changed_cells = [index for index in previous_cells.keys() | self._parsed_cells.keys()
+                             if previous_cells.get(index) != self._parsed_cells.get(index)]
+            for index in changed_cells:
+                if index in previous_cells:
+                    self.game_map.remove_unit(list(CELL_LOCATIONS[index]))
+        for index in changed_cells:
+            self.__create_parsed_units(CELL_LOCATIONS[index], self._parsed_cells.get(index, ()))
+
+    def __group_parsed_units(self, units, player_number):
         """
-        Helper function for __parse_state to add units to the map.
+        Helper function for __parse_state to sort the units of a player by cell index, in the order they are listed.
         """
         typedef = self.config.get("unitInformation")
         for i, unit_types in enumerate(units):
@@ -136,18 +252,26 @@ class GameState:
                 unit_type = typedef[i].get("shorthand")
                 sx, sy, shp = uinfo[:3]
                 x, y = map(int, [sx, sy])
-                hp = float(shp)
-                # This depends on RM and UP always being the last types to be processed
-                if unit_type == REMOVE:
-                    # Quick fix will deploy engine fix soon
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
-                elif unit_type == UPGRADE:
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
-                else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                self._parsed_cells.setdefault(cell_index([x, y]), []).append((unit_type, player_number, float(shp)))
+
+    def __create_parsed_units(self, location, units):
+        """
+        Helper function for __parse_state to add the units of one cell to the map.
+        """
+        x, y = location
+        for unit_type, player_number, hp in units:
+            # This depends on RM and UP always being listed after the other types
+            if unit_type == REMOVE:
+                # Quick fix will deploy engine fix soon
+                if self.contains_stationary_unit([x,y]):
+                    self.game_map[x,y][0].pending_removal = True
+                    self.game_map.refresh_cell([x, y])
+            elif unit_type == UPGRADE:
+                if self.contains_stationary_unit([x,y]):
+                    self.game_map[x,y][0].upgrade()
+                    self.game_map.refresh_cell([x, y])
+            else:
+                self.game_map.add_unit(unit_type, [x, y], player_number, hp)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -179,6 +303,7 @@ class GameState:
         deploy_string = json.dumps(self._deploy_stack)
         send_command(build_string)
         send_command(deploy_string)
+        flush_debug()
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -333,7 +458,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = cell_index(location) in FRIENDLY_EDGE_CELLS
 
         if self.enable_warnings:
             fail_reason = ""
@@ -446,6 +571,7 @@ class GameState:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
                         existing_unit.upgrade()
+                        self.game_map.refresh_cell([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -485,7 +611,8 @@ class GameState:
 
         Returns:
             A list of locations corresponding to the path the unit would take 
-            to get from it's starting location to the best available end location
+            to get from it's starting location to the best available end location.
+            Paths are cached until a structure changes, so the list must not be modified.
 
         """
         if self.contains_stationary_unit(start_location):
@@ -495,8 +622,77 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
+        paths = self.__current_path_cache()
+        key = (start_location[0], start_location[1], target_edge)
+        path = paths.get(key)
+        if path is not None:
+            self.path_cache_hits += 1
+            return path
+        self.path_cache_misses += 1
+
         end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        path = paths[key] = self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        return path
+
+    def find_paths_from_edges(self, locations=None):
+        """Gets the paths units spawned at several of our edge locations would take, in a single pass.
+        Much faster than calling find_path_to_edge for each location
+
+        Args:
+            locations: The spawn locations to path from. Every BOTTOM_LEFT and BOTTOM_RIGHT location if None.
+
+        Returns:
+            A dict mapping each (x, y) tuple to the path a unit spawned there would take.
+            Locations blocked by a structure are left out.
+
+        """
+        if locations is None:
+            locations = self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT)
+
+        cached_paths = self.__current_path_cache()
+        paths = {}
+        starts_by_edge = {}
+        for location in locations:
+            if not self.game_map.in_arena_bounds(location):
+                self.warn("Attempted to perform pathing from out of bounds location {}".format(location))
+                continue
+            target_edge = self.get_target_edge(location)
+            path = cached_paths.get((location[0], location[1], target_edge))
+            if path is not None:
+                self.path_cache_hits += 1
+                paths[tuple(location)] = path
+                continue
+            starts_by_edge.setdefault(target_edge, []).append(location)
+
+        for target_edge, starts in starts_by_edge.items():
+            end_points = self.game_map.get_edge_locations(target_edge)
+            for location, path in zip(starts, self._shortest_path_finder.navigate_multiple_starts(starts, end_points, self)):
+                if path is not None:
+                    self.path_cache_misses += 1
+                    cached_paths[(location[0], location[1], target_edge)] = path
+                    paths[tuple(location)] = path
+        return paths
+
+    def __current_path_cache(self):
+        """The paths found on the board as it is now, keyed by (x, y, target_edge).
+        Emptied whenever the map version changes. Paths in it are shared, callers must not modify them
+        """
+        if self._path_cache_version != self.game_map.version:
+            self._path_cache = {}
+            self._path_cache_version = self.game_map.version
+        return self._path_cache
+
+    def precompute_path_fields(self, game_states):
+        """Computes the distance fields of several hypothetical boards in one vectorized pass per edge.
+        Later calls to find_path_to_edge on any of those boards skip the search. Requires NumPy
+
+        Args:
+            game_states: A list of GameStates, usually copies of this one with different structures
+
+        """
+        structure_masks = [game_state.game_map.structure_mask for game_state in game_states]
+        for target_edge in [self.game_map.TOP_RIGHT, self.game_map.TOP_LEFT, self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT]:
+            self._shortest_path_finder.batch_edge_fields(structure_masks, self.game_map.get_edge_locations(target_edge))
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -512,17 +708,31 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
+        if self.game_map.unit_arrays.structure_type[x * self.ARENA_SIZE + y] < 0:
+            return False
         for unit in self.game_map[x,y]:
             if unit.stationary:
                 return unit
         return False
 
+    def filter_blocked_locations(self, locations):
+        """Keeps the locations without a structure, read from the structure bitboard
+
+        Args:
+            locations: A list of locations
+
+        Returns:
+            The locations a mobile unit could be spawned on or path through
+        """
+        mask = self.game_map.structure_mask
+        return [location for location in locations if not (self.game_map.in_arena_bounds(location) and mask >> cell_index(location) & 1)]
+
     def warn(self, message):
         """ Used internally by game_state to print warnings
         """
 
         if(self.enable_warnings):
-            debug_write(message)
+            debug_write(message, level=WARNING)
 
     def suppress_warnings(self, suppress):
         """Suppress all warnings
@@ -555,7 +765,7 @@ class GameState:
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange)
+        possible_cells, cell_distances = self.game_map.get_cells_in_range(attacker_location, attacking_unit.attackRange)
         target = None
         target_stationary = True
         target_distance = sys.maxsize
@@ -563,14 +773,13 @@ class GameState:
         target_y = self.ARENA_SIZE
         target_x_distance = 0
 
-        for location in possible_locations:
-            for unit in self.game_map[location]:
+        for index, unit_distance in zip(possible_cells, cell_distances):
+            for unit in self.game_map[CELL_LOCATIONS[index]]:
                 if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
                     continue
 
                 new_target = False
                 unit_stationary = unit.stationary
-                unit_distance = self.game_map.distance_between_locations(location, [attacking_unit.x, attacking_unit.y])
                 unit_health = unit.health
                 unit_y = unit.y
                 unit_x_distance = abs(self.HALF_ARENA - 0.5 - unit.x)
@@ -614,6 +823,73 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def get_targets(self, attacking_units):
+        """Returns the targets several units would choose on the current board, exactly as get_target would one unit at a time.
+        Each occupied cell is ranked once per call instead of once per attacker in range of it, so simulators
+        resolving a whole frame of attacks should prefer this
+
+        Args:
+            attacking_units: A list of GameUnits
+
+        Returns:
+            A list holding the GameUnit each unit would attack, or None, in the order of attacking_units
+
+        """
+        # The cells holding units of each player
+        occupied = [self.game_map.structure_bitboard(player_index) | self.game_map.unit_arrays.mobile_masks[player_index] for player_index in [0, 1]]
+        ranked_cells = {}
+        targets = []
+        for attacking_unit in attacking_units:
+            if not isinstance(attacking_unit, GameUnit):
+                self.warn("Passed a {} to get_targets as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
+                targets.append(None)
+                continue
+            if attacking_unit.player_index not in (0, 1):
+                targets.append(self.get_target(attacking_unit))
+                continue
+            enemy_index = 1 - attacking_unit.player_index
+            enemy_cells = occupied[enemy_index]
+            possible_cells, cell_distances = self.game_map.get_cells_in_range([attacking_unit.x, attacking_unit.y], attacking_unit.attackRange)
+            target_key = None
+            target = None
+            for index, distance in zip(possible_cells, cell_distances):
+                if not enemy_cells >> index & 1:
+                    continue
+                ranked = ranked_cells.get(index)
+                if ranked is None:
+                    ranked = ranked_cells[index] = self.__rank_targets(CELL_LOCATIONS[index])
+                # Mobile units first, then the nearest, then as ranked by __rank_targets
+                for stationary, can_attack in [(0, attacking_unit.damage_i != 0), (1, attacking_unit.damage_f != 0)]:
+                    entry = ranked[enemy_index][stationary]
+                    if entry is None or not can_attack:
+                        continue
+                    key = (stationary, distance) + entry[0]
+                    if target_key is None or key < target_key:
+                        target_key = key
+                        target = entry[1]
+            targets.append(target)
+        return targets
+
+    def __rank_targets(self, location):
+        """Ranks the units at a location for get_targets.
+
+        Returns:
+            For each player index, the (key, unit) pairs of that player's best mobile unit and best structure at the location,
+            None when there is none. The key is (health, y, x distance) ordered as get_target breaks ties,
+            the first unit in the list winning exact ties
+        """
+        ranked = ([None, None], [None, None])
+        for unit in self.game_map[location]:
+            if unit.player_index not in (0, 1):
+                continue
+            # Player 0 goes for the lowest units, player 1 for the highest, both for those furthest from the middle
+            y_key = unit.y if unit.player_index == 1 else -unit.y
+            key = (unit.health, y_key, -abs(self.HALF_ARENA - 0.5 - unit.x))
+            entry = ranked[unit.player_index][unit.stationary]
+            if entry is None or key < entry[0]:
+                ranked[unit.player_index][unit.stationary] = (key, unit)
+        return ranked
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -633,15 +909,132 @@ class GameState:
 
         attackers = []
         """
-        Get locations in the range of TURRET units
+        Get locations in the range of TURRET units, upgraded ones included
         """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
-        for location_unit in possible_locations:
-            for unit in self.game_map[location_unit]:
-                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
+        possible_cells, cell_distances = self.game_map.get_cells_in_range(location, self._max_attack_range)
+        unit_arrays = self.game_map.unit_arrays
+        mobile_counts = unit_arrays.mobile_counts
+        # Only cells holding an enemy structure or enemy mobile units can attack
+        enemy_slots = None
+        if player_index in (0, 1):
+            enemy_slots = [((1 - player_index) * unit_arrays.MOBILE_TYPES + slot) * CELL_COUNT for slot in range(unit_arrays.MOBILE_TYPES)]
+        for index, distance in zip(possible_cells, cell_distances):
+            if enemy_slots is not None:
+                owner = unit_arrays.structure_owner[index]
+                if (owner < 0 or owner == player_index) and not any(mobile_counts[slot + index] for slot in enemy_slots):
+                    continue
+            for unit in self.game_map[CELL_LOCATIONS[index]]:
+                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and distance <= unit.attackRange:
                     attackers.append(unit)
         return attackers
+
+    def threat_map(self, player_index):
+        """Gets the damage the enemy structures could deal to a player's units on every cell.
+        Unlike get_attackers, enemy mobile units are left out.
+        Computed once per layout of enemy structures and upgrades, so the damage along a path is a sum of lookups
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A ThreatMap, shared by later calls, which must not modify it
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        enemy_index = 1 - player_index
+        key = self.__layout_key(enemy_index)
+        cached = self._threat_maps[player_index]
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        threats = ThreatMap(array('H', [0]) * CELL_COUNT, array('d', [0.0]) * CELL_COUNT, array('d', [0.0]) * CELL_COUNT)
+        for location in self.game_map.structure_locations(enemy_index):
+            for unit in self.game_map[location]:
+                if not unit.stationary or unit.damage_i + unit.damage_f <= 0:
+                    continue
+                # The same cells get_attackers would find this unit from
+                possible_cells, cell_distances = self.game_map.get_cells_in_range(location, self._max_attack_range)
+                for index, distance in zip(possible_cells, cell_distances):
+                    if distance <= unit.attackRange:
+                        threats.attackers[index] += 1
+                        threats.damage_i[index] += unit.damage_i
+                        threats.damage_f[index] += unit.damage_f
+        self._threat_maps[player_index] = (key, threats)
+        return threats
+
+    def get_path_damage(self, path, player_index):
+        """Estimates the damage a mobile unit would take per frame spent on each location of a path, from the threat map
+
+        Args:
+            path: A list of locations, as returned by find_path_to_edge
+            player_index: The player controlling the unit, 0 for you 1 for the enemy
+
+        Returns:
+            The sum of the damage against mobile units over the path
+
+        """
+        damage_i = self.threat_map(player_index).damage_i
+        return sum(damage_i[cell_index(location)] for location in path)
+
+    def shield_map(self, player_index):
+        """Gets the shield a player's supports would give to that player's mobile units on every cell.
+        Computed once per layout of the player's structures and upgrades, like threat_map
+
+        Args:
+            player_index: The player owning the supports and the shielded units, 0 for you 1 for the enemy
+
+        Returns:
+            A ShieldMap, shared by later calls, which must not modify it
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        key = self.__layout_key(player_index)
+        cached = self._shield_maps[player_index]
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        shield = array('d', [0.0]) * CELL_COUNT
+        sources = [0] * CELL_COUNT
+        amounts = []
+        for location in self.game_map.structure_locations(player_index):
+            for unit in self.game_map[location]:
+                if not unit.stationary or unit.shieldPerUnit + unit.shieldBonusPerY <= 0 or unit.shieldRange <= 0:
+                    continue
+                # Supports further up the board give more, counted from the player's own edge
+                rows_forward = unit.y if player_index == 0 else self.ARENA_SIZE - 1 - unit.y
+                amount = unit.shieldPerUnit + unit.shieldBonusPerY * rows_forward
+                bit = 1 << len(amounts)
+                amounts.append(amount)
+                for index in self.game_map.get_cells_in_range(location, unit.shieldRange)[0]:
+                    shield[index] += amount
+                    sources[index] |= bit
+        shields = ShieldMap(shield, sources, tuple(amounts))
+        self._shield_maps[player_index] = (key, shields)
+        return shields
+
+    def get_path_shielding(self, path, player_index):
+        """Gets the shield a mobile unit would collect following a path. Each support shields a unit once,
+        so the unit's effective health is its health plus this
+
+        Args:
+            path: A list of locations, as returned by find_path_to_edge
+            player_index: The player controlling the unit, 0 for you 1 for the enemy
+
+        Returns:
+            The total shield of the supports in range of any location of the path
+
+        """
+        shields = self.shield_map(player_index)
+        supports = 0
+        for location in path:
+            supports |= shields.sources[cell_index(location)]
+        return sum(amount for bit, amount in enumerate(shields.amounts) if supports >> bit & 1)
+
+    def __layout_key(self, player_index):
+        """Identifies the structures of a player and every upgrade on the board, to key the threat and shield maps
+        """
+        return tuple(self.game_map.structure_boards[player_index]), bytes(self.game_map.unit_arrays.structure_upgraded)
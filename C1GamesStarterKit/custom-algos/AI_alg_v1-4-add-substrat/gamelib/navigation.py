@@ -1,24 +1,217 @@
 import heapq
 import math
 import sys
-import queue
+from array import array
+from collections import OrderedDict, deque
+from .game_map import ARENA_SIZE, CELL_COUNT, CELL_LOCATIONS, EDGE_LOCATIONS, HALF_ARENA, NEIGHBORS, VALID_CELLS, cell_index
 from .util import debug_write
 
-class Node:
-    """A path-finding node
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _blocked_from_mask(mask):
+    """Expands a GameMap.structure_mask into a bytearray indexed with cell_index
+    """
+    blocked = bytearray(CELL_COUNT)
+    while mask:
+        lowest = mask & -mask
+        blocked[lowest.bit_length() - 1] = 1
+        mask ^= lowest
+    return blocked
+
+
+def numpy_distance_fields(blocked, end_points):
+    """Computes the edge distance field of one or many structure layouts with NumPy.
+    Each breadth first search step grows the frontier of every layout at once with array shifts
+
+    Args:
+        * blocked: A bool array of shape (28, 28) or (batch, 28, 28) indexed [x, y], True where a structure stands
+        * end_points: The end points of the units, should be a list of edge locations
+
+    Returns:
+        An int32 array with the shape of blocked holding the pathlength of every cell, -1 where no end point can be reached.
+        Flattening one layout gives the same indexing as cell_index.
+
+    """
+    if np is None:
+        raise ImportError("numpy_distance_fields requires NumPy")
+
+    blocked = np.asarray(blocked, dtype=bool)
+    single = blocked.ndim == 2
+    if single:
+        blocked = blocked[np.newaxis]
+    batch = blocked.shape[0]
+
+    # Work on all the boards flattened into one row, each with a border of blocked cells,
+    # so neighbours are fixed offsets and a shift can never wrap into another row or board
+    width = ARENA_SIZE + 2
+    inner = (slice(None), slice(1, -1), slice(1, -1))
+    valid = np.frombuffer(bytes(VALID_CELLS), dtype=np.uint8).reshape(ARENA_SIZE, ARENA_SIZE).astype(bool)
+    targets = np.zeros((ARENA_SIZE, ARENA_SIZE), dtype=bool)
+    targets[[location[0] for location in end_points], [location[1] for location in end_points]] = True
+
+    frontier = np.zeros((batch, width, width), dtype=bool)
+    frontier[inner] = targets & valid & ~blocked
+    remaining = np.zeros((batch, width, width), dtype=bool)
+    remaining[inner] = valid & ~targets & ~blocked
+    frontier = frontier.ravel()
+    remaining = remaining.ravel()
+
+    # Every step adds one to the cells not reached yet, which leaves each cell holding the step it was reached on.
+    # The ends of grown keep stale values, they are border cells that never remain
+    pathlength = np.zeros(remaining.shape, dtype=np.int32)
+    grown = np.zeros_like(frontier)
+    while frontier.any():
+        pathlength += remaining
+        np.logical_or(frontier[:-2], frontier[2:], out=grown[1:-1])
+        grown[width:-width] |= frontier[:-2 * width]
+        grown[width:-width] |= frontier[2 * width:]
+        grown &= remaining
+        remaining ^= grown
+        frontier, grown = grown, frontier
+
+    pathlength = pathlength.reshape(batch, width, width)[inner]
+    unreachable = remaining.reshape(batch, width, width)[inner] | ~(valid & ~blocked)
+    unreachable &= ~targets
+    pathlength[unreachable] = -1
+    pathlength[:, targets] = 0
+    return pathlength[0] if single else pathlength
+
+
+def idealness_table(end_points):
+    """Computes the idealness of every cell for units heading to end_points, as ShortestPathFinder._get_idealness does
+
+    Returns:
+        An array indexed with cell_index, sys.maxsize at the end points
+    """
+    x, y = end_points[0]
+    table = array('q', bytes(8 * CELL_COUNT))
+    for index, (cell_x, cell_y) in enumerate(CELL_LOCATIONS):
+        table[index] = (ARENA_SIZE * (cell_y if y >= HALF_ARENA else ARENA_SIZE - 1 - cell_y) +
+                        (cell_x if x >= HALF_ARENA else ARENA_SIZE - 1 - cell_x))
+    for location in end_points:
+        table[cell_index(location)] = sys.maxsize
+    return table
+
+
+"""
+Idealness tables of the four edges, built once at import and keyed by the cell indices of the edge
+"""
+EDGE_IDEALNESS = {tuple(cell_index(location) for location in edge): idealness_table(edge) for edge in EDGE_LOCATIONS}
+
+"""
+Neighbours of every cell as (slot, cell index) pairs, where the slot is the position of the
+step in the up, down, right, left order of ShortestPathFinder._get_neighbors
+"""
+SLOT_OFFSETS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+NEIGHBOR_SLOTS = tuple(tuple((SLOT_OFFSETS.index((neighbor // ARENA_SIZE - index // ARENA_SIZE, neighbor % ARENA_SIZE - index % ARENA_SIZE)), neighbor)
+                             for neighbor in NEIGHBORS[index]) for index in range(CELL_COUNT))
+STAY = len(SLOT_OFFSETS)
+
+
+class DistanceField:
+    """Pathlengths from every cell of one structure layout to a target
 
     Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
+        * blocked (bytearray): 1 for every cell holding a structure, indexed with cell_index
+        * pathlength (array): The distance between each cell and the target, -1 if the target can't be reached
+        * targets (frozenset): For an edge field, the cell indices of the edge
+        * pockets (dict): For an edge field, maps cells that can't reach the edge to the field of their self destruct pocket
+
+    An edge field can be repaired in place with block and unblock when a single structure
+    is added or destroyed, which only touches the cells whose distance actually changes.
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, blocked, pathlength, targets=frozenset()):
+        self.blocked = blocked
+        self.pathlength = pathlength
+        self.targets = targets
+        self.pockets = {}
+
+    def copy(self, blocked):
+        """A copy of this field that reads the given blocked array, without its pocket fields
+        """
+        return DistanceField(blocked, self.pathlength[:], self.targets)
+
+    def block(self, index):
+        """Marks a cell as blocked and raises the pathlengths of every cell that was routed through it
+
+        Args:
+            index: The cell_index of the new structure
+        """
+        pathlength = self.pathlength
+        self.blocked[index] = 1
+        if pathlength[index] < 0:
+            return
+        pathlength[index] = -1
+
+        # Find the cells that lost every neighbour one step closer to the target
+        affected = {index}
+        support = {}
+        current = deque([index])
+        while current:
+            parent = current.popleft()
+            for child in NEIGHBORS[parent]:
+                if child in self.targets or child in affected or self.blocked[child]:
+                    continue
+                child_length = pathlength[child]
+                if child in support:
+                    support[child] -= 1
+                elif child_length > 0:
+                    support[child] = sum(1 for other in NEIGHBORS[child]
+                                         if other not in affected and not self.blocked[other] and pathlength[other] == child_length - 1)
+                else:
+                    continue
+                if support[child] == 0:
+                    affected.add(child)
+                    current.append(child)
+
+        # Grow them back from the unaffected cells around them
+        frontier = []
+        for cell in affected:
+            pathlength[cell] = -1
+        for cell in affected:
+            for other in NEIGHBORS[cell]:
+                if other not in affected and not self.blocked[other] and pathlength[other] >= 0:
+                    heapq.heappush(frontier, (pathlength[other], other))
+        while frontier:
+            length, cell = heapq.heappop(frontier)
+            if length > pathlength[cell]:
+                continue
+            for other in NEIGHBORS[cell]:
+                if other in affected and not self.blocked[other] and (pathlength[other] < 0 or pathlength[other] > length + 1):
+                    pathlength[other] = length + 1
+                    heapq.heappush(frontier, (length + 1, other))
+
+    def unblock(self, index):
+        """Marks a cell as open and lowers the pathlengths of every cell that can now take a shortcut through it
+
+        Args:
+            index: The cell_index of the removed structure
+        """
+        pathlength = self.pathlength
+        self.blocked[index] = 0
+        if index in self.targets:
+            pathlength[index] = 0
+        else:
+            reachable = [pathlength[other] for other in NEIGHBORS[index] if not self.blocked[other] and pathlength[other] >= 0]
+            if not reachable:
+                pathlength[index] = -1
+                return
+            pathlength[index] = min(reachable) + 1
+
+        current = deque([index])
+        while current:
+            cell = current.popleft()
+            length = pathlength[cell] + 1
+            for other in NEIGHBORS[cell]:
+                if not self.blocked[other] and (pathlength[other] < 0 or pathlength[other] > length):
+                    pathlength[other] = length
+                    current.append(other)
+
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -33,13 +226,47 @@ class ShortestPathFinder:
         * VERTICAL (int): A constant representing a vertical movement
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * blocked (bytearray): 1 for every cell holding a structure, indexed with cell_index
+        * visited_idealness (bytearray): 1 for every cell visited during the idealness search step
+        * visited_validate (bytearray): 1 for every cell visited during the validation step
+        * pathlength (array): The distance between each cell and the target location, -1 if unvisited
+
+    The visited arrays and the search queue are allocated once and reset in place before every search.
+    A breadth first search visits every cell at most once, so the queue is a flat list of CELL_COUNT
+    cell indices read and written through head and tail positions.
+    Distance fields only depend on the structure layout and the target edge, so they are
+    kept in a cache shared by every pathfinder, keyed by GameMap.structure_mask. Adding or
+    removing a structure through GameMap changes the mask, so a stale field is never served,
+    and the least recently used layouts are evicted once FIELD_CACHE_SIZE is reached.
+    Code that edits the unit lists of a GameMap directly should call clear_cache().
+
+    A layout that differs from the last one used in at most REPAIR_LIMIT cells, such as a
+    structure destroyed mid simulation, gets its edge fields repaired from the last layout
+    instead of searched again from scratch.
 
     """
+    FIELD_CACHE_SIZE = 64
+    REPAIR_LIMIT = 4
+    _field_cache = OrderedDict()
+
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self.blocked = bytearray(CELL_COUNT)
+        self.visited_idealness = bytearray(CELL_COUNT)
+        self.visited_validate = bytearray(CELL_COUNT)
+        self.pathlength = array('i', [-1]) * CELL_COUNT
+        self._empty = bytes(CELL_COUNT)
+        self._unset = array('i', [-1]) * CELL_COUNT
+        self._queue = [0] * CELL_COUNT
+        self._edge_fields = {}
+
+    @classmethod
+    def clear_cache(cls):
+        """Forgets every cached distance field
+        """
+        cls._field_cache.clear()
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -47,10 +274,83 @@ class ShortestPathFinder:
         Args:
             game_state: A GameState object representing the gamestate we want to traverse
         """
-        #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        mask = game_state.game_map.structure_mask
+        cache = ShortestPathFinder._field_cache
+        board = cache.get(mask)
+        if board is None:
+            board = self._repair_last_board(mask) if cache else None
+            if board is None:
+                board = (_blocked_from_mask(mask), {})
+            cache[mask] = board
+            if len(cache) > self.FIELD_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(mask)
+        self.blocked, self._edge_fields = board
+
+    def batch_edge_fields(self, structure_masks, end_points):
+        """Computes the distance fields of many structure layouts in one vectorized call and caches them,
+        so later path queries on any of those layouts skip the search. Requires NumPy
+
+        Args:
+            * structure_masks: A list of GameMap.structure_mask values, one per candidate layout
+            * end_points: The end points of the units, should be a list of edge locations
+
+        Returns:
+            An int32 array of shape (len(structure_masks), 28, 28) with every layout's pathlengths
+
+        """
+        if np is None:
+            raise ImportError("batch_edge_fields requires NumPy")
+
+        byte_count = (CELL_COUNT + 7) // 8
+        blocked = np.stack([np.unpackbits(np.frombuffer(mask.to_bytes(byte_count, "little"), dtype=np.uint8), bitorder="little")[:CELL_COUNT]
+                            for mask in structure_masks]).astype(bool).reshape(-1, ARENA_SIZE, ARENA_SIZE)
+        fields = numpy_distance_fields(blocked, end_points)
+
+        key = tuple(cell_index(location) for location in end_points)
+        cache = ShortestPathFinder._field_cache
+        for mask, field in zip(structure_masks, fields):
+            board = cache.get(mask)
+            if board is None:
+                board = (_blocked_from_mask(mask), {})
+                cache[mask] = board
+                if len(cache) > self.FIELD_CACHE_SIZE:
+                    cache.popitem(last=False)
+            if key not in board[1]:
+                pathlength = array('i')
+                pathlength.frombytes(field.astype(np.intc).tobytes())
+                board[1][key] = DistanceField(board[0], pathlength, frozenset(key))
+        return fields
+
+    def _repair_last_board(self, mask):
+        """Derives the fields of a layout from the most recently used one when only a few cells changed
+
+        Returns:
+            A (blocked, edge_fields) pair, or None if the layouts are too different
+        """
+        last_mask = next(reversed(ShortestPathFinder._field_cache))
+        changed = mask ^ last_mask
+        if bin(changed).count("1") > self.REPAIR_LIMIT:
+            return None
+
+        last_blocked, last_fields = ShortestPathFinder._field_cache[last_mask]
+        blocked = bytearray(last_blocked)
+        fields = {key: field.copy(blocked) for key, field in last_fields.items()}
+        while changed:
+            lowest = changed & -changed
+            index = lowest.bit_length() - 1
+            changed ^= lowest
+            for field in fields.values():
+                if mask & lowest:
+                    field.block(index)
+                else:
+                    field.unblock(index)
+            # A field without repairs still needs the blocked array updated
+            blocked[index] = 1 if mask & lowest else 0
+        return (blocked, fields)
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -70,44 +370,95 @@ class ShortestPathFinder:
 
         #Initialize map 
         self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
         #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
+        self.pathlength = self._get_field(start_point, end_points).pathlength
         return self._get_path(start_point, end_points)
 
+    def navigate_multiple_starts(self, start_points, end_points, game_state):
+        """Finds the paths units at several start points would take to reach the same set of endpoints.
+        The board is only read once and every start shares the same distance fields
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            A list with the path for each start point, None where the start point holds a structure
+
+        """
+        self.initialize_map(game_state)
+        paths = []
+        for start_point in start_points:
+            if self.blocked[cell_index(start_point)]:
+                paths.append(None)
+                continue
+            self.pathlength = self._get_field(start_point, end_points).pathlength
+            paths.append(self._get_path(start_point, end_points))
+        return paths
+
+    def _get_field(self, start_point, end_points):
+        """Gets the distance field a unit at start_point follows, computing it if this board has not seen it yet.
+        Every start that can reach the edge shares one field, every self destruct pocket gets its own
+        """
+        key = tuple(cell_index(location) for location in end_points)
+        edge_field = self._edge_fields.get(key)
+        if edge_field is None:
+            edge_field = DistanceField(self.blocked, self._validate(end_points[0], end_points), frozenset(key))
+            self._edge_fields[key] = edge_field
+
+        start_index = cell_index(start_point)
+        if edge_field.pathlength[start_index] >= 0:
+            return edge_field
+
+        pocket_field = edge_field.pockets.get(start_index)
+        if pocket_field is None:
+            ideal_tile = self._idealness_search(start_point, end_points)
+            pocket_field = DistanceField(self.blocked, self._validate(ideal_tile, end_points))
+            for index, visited in enumerate(self.visited_idealness):
+                if visited:
+                    edge_field.pockets[index] = pocket_field
+        return pocket_field
+
     def _idealness_search(self, start, end_points):
         """
         Finds the most ideal tile in our 'pocket' of pathable space. 
         The edge if it is available, or the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
-
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        idealness = EDGE_IDEALNESS.get(tuple(cell_index(location) for location in end_points))
+        if idealness is None:
+            idealness = idealness_table(end_points)
+
+        visited = self.visited_idealness
+        blocked = self.blocked
+        current = self._queue
+        visited[:] = self._empty
+        start_index = cell_index(start)
+        current[0] = start_index
+        head, tail = 0, 1
+        best_idealness = idealness[start_index]
+        visited[start_index] = 1
+        most_ideal = start_index
+
+        while head < tail:
+            search_index = current[head]
+            head += 1
+            for index in NEIGHBORS[search_index]:
+                if blocked[index]:
                     continue
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
+                current_idealness = idealness[index]
 
                 if current_idealness > best_idealness:
                     best_idealness = current_idealness
-                    most_ideal = neighbor
+                    most_ideal = index
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+                if not visited[index]:
+                    visited[index] = 1
+                    current[tail] = index
+                    tail += 1
 
-        return most_ideal
+        return list(CELL_LOCATIONS[most_ideal])
 
     def _get_neighbors(self, location):
         """Get the locations adjacent to a location
@@ -128,9 +479,9 @@ class ShortestPathFinder:
         point = end_points[0]
         x, y = point
         direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
+        if x < HALF_ARENA:
            direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
+        if y < HALF_ARENA:
             direction[1] = -1
         return direction
 
@@ -161,63 +512,82 @@ class ShortestPathFinder:
     def _validate(self, ideal_tile, end_points):
         """Breadth first search of the grid, setting the pathlengths of each node
 
+        Returns:
+            A new pathlength array for the searched area
         """
         #VALIDATION
+        visited = self.visited_validate
+        blocked = self.blocked
+        visited[:] = self._empty
+        pathlength = self.pathlength = self._unset[:]
+        current = self._queue
         #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
-        else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
+        sources = end_points if ideal_tile in end_points else [ideal_tile]
+        tail = 0
+        for location in sources:
+            index = cell_index(location)
+            current[tail] = index
+            tail += 1
+            #Set current pathlength to 0
+            pathlength[index] = 0
+            visited[index] = 1
 
         #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
+        head = 0
+        while head < tail:
+            current_index = current[head]
+            head += 1
+            if blocked[current_index]:
+                continue
+            length = pathlength[current_index] + 1
+            for index in NEIGHBORS[current_index]:
+                if not visited[index] and not blocked[index]:
+                    pathlength[index] = length
+                    visited[index] = 1
+                    current[tail] = index
+                    tail += 1
 
         #debug_write("Print after validate")
         #self.print_map()
-        return
+        return self.pathlength
 
     def _get_path(self, start_point, end_points):
-        """Once all nodes are validated, and a target is found, the unit can path to its target
+        """Once all nodes are validated, and a target is found, the unit can path to its target.
+        Steps are chosen as _choose_next_move does, with its tie breaks read from TIE_BREAKS
 
         """
         #GET THE PATH
-        path = [start_point]
-        current = start_point
+        pathlength = self.pathlength
+        blocked = self.blocked
+        tie_breaks = TIE_BREAKS[tuple(self._get_direction_from_endpoints(end_points))]
+        current = cell_index(start_point)
+        cells = []
         move_direction = 0
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
-
-            if current[0] == next_move[0]:
-                move_direction = self.VERTICAL
-            else:
-                move_direction = self.HORIZONTAL
-            path.append(next_move)
-            current = next_move
-        
-        #debug_write(path)
-        return path
-  
+        while pathlength[current]:
+            better = tie_breaks[move_direction]
+            best = current
+            best_slot = STAY
+            best_pathlength = pathlength[current]
+            for slot, index in NEIGHBOR_SLOTS[current]:
+                if blocked[index]:
+                    continue
+                current_pathlength = pathlength[index]
+                #Filter by pathlength, then by direction based on prev move
+                if current_pathlength > best_pathlength:
+                    continue
+                if current_pathlength == best_pathlength and not better[best_slot][slot]:
+                    continue
+                best = index
+                best_slot = slot
+                best_pathlength = current_pathlength
+
+            move_direction = self.HORIZONTAL if best_slot > 1 and best_slot != STAY else self.VERTICAL
+            cells.append(best)
+            current = best
+
+        return [list(start_point)] + [list(CELL_LOCATIONS[index]) for index in cells]
+
     def _choose_next_move(self, current_point, previous_move_direction, end_points):
         """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
         """
@@ -225,15 +595,14 @@ class ShortestPathFinder:
         #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
 
         ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
+        best_pathlength = self.pathlength[cell_index(current_point)]
         for neighbor in neighbors:
             #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.blocked[cell_index(neighbor)]:
                 continue
 
             new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
+            current_pathlength = self.pathlength[cell_index(neighbor)]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
@@ -297,20 +666,50 @@ class ShortestPathFinder:
             debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
             return
 
+        rows = []
         for y in range(28):
+            row = []
             for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+                index = cell_index([x, 28 - y - 1])
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    row.append(self._justified(self.pathlength[index]))
                 else:
-                    sys.stderr.write("   ")
-            debug_write("")
+                    row.append("   ")
+            rows.append("".join(row))
+        debug_write("\n".join(rows))
 
-    def _print_justified(self, number):
-        """Prints a number between 100 and -10 in 3 spaces
+    def _justified(self, number):
+        """Writes a number between 100 and -10 in 3 spaces
 
         """
         if number < 10 and number > -1:
-            sys.stderr.write(" ")
-        sys.stderr.write(str(number))
-        sys.stderr.write(" ")
+            return " {} ".format(number)
+        return "{} ".format(number)
+
+
+def _compile_tie_breaks():
+    """Evaluates ShortestPathFinder._better_direction once for every case it can be asked about
+
+    Returns:
+        A dict mapping the direction of an edge, as given by _get_direction_from_endpoints, to a table
+        indexed [previous move direction][slot of the best step so far][slot of the contender].
+        The best step so far is STAY before any neighbour has been accepted
+    """
+    finder = ShortestPathFinder()
+    center = [HALF_ARENA, HALF_ARENA]
+    steps = [[center[0] + x, center[1] + y] for x, y in SLOT_OFFSETS] + [center]
+    tie_breaks = {}
+    for direction in [(1, 1), (-1, 1), (-1, -1), (1, -1)]:
+        end_points = [[HALF_ARENA if direction[0] == 1 else 0, HALF_ARENA if direction[1] == 1 else 0]]
+        tie_breaks[direction] = tuple(
+            tuple(tuple(finder._better_direction(center, steps[slot], steps[best_slot], move_direction, end_points)
+                        for slot in range(STAY))
+                  for best_slot in range(STAY + 1))
+            for move_direction in [0, finder.HORIZONTAL, finder.VERTICAL])
+    return tie_breaks
+
+
+"""
+The tie break rules of ShortestPathFinder._better_direction as tables, built once at import
+"""
+TIE_BREAKS = _compile_tie_breaks()
@@ -1,194 +1,203 @@
 import unittest
+import io
 import json
+import random
+import sys
+from .algocore import AlgoCore, ActionFrame, has_events, message_type
+from .budget import TurnBudget
 from .game_state import GameState
+from .game_map import CELL_LOCATIONS
+from .navigation import EDGE_IDEALNESS, ShortestPathFinder, idealness_table, numpy_distance_fields, np
 from .unit import GameUnit
+from .util import DEBUG, INFO, WARNING, OFF, debug_enabled, debug_write, flush_debug, set_debug_output
+
+TEST_CONFIG = """
+    {
+    "seasonCompatibilityModeP1": 5,
+    "seasonCompatibilityModeP2": 5,
+    "debug":{
+        "printMapString":false,
+        "printTStrings":false,
+        "printActStrings":false,
+        "printHitStrings":false,
+        "printPlayerInputStrings":false,
+        "printBotErrors":true,
+        "printPlayerGetHitStrings":false
+    },
+    "unitInformation": [
+        {
+        "icon": "S3_filter",
+        "iconxScale": 0.4,
+        "iconyScale": 0.4,
+        "cost1": 1.0,
+        "getHitRadius":0.01,
+        "display":"filter",
+        "shorthand":"FF",
+        "startHealth":75.0,
+        "unitCategory": 0,
+        "refundPercentage": 0.75,
+        "turnsRequiredToRemove": 1,
+        "upgrade": {
+            "startHealth": 150.0
+        }
+        },
+        {
+        "icon": "S3_encryptor",
+        "iconxScale": 0.5,
+        "iconyScale": 0.5,
+        "cost1":4.0,
+        "getHitRadius":0.01,
+        "display":"encryptor",
+        "shieldRange":0,
+        "shorthand":"EF",
+        "startHealth":30.0,
+        "unitCategory": 0,
+        "refundPercentage": 0.75,
+        "turnsRequiredToRemove": 1,
+        "generatesResource1": 1,
+        "upgrade": {
+            "generatesResource2": 1
+        }
+        },
+        {
+        "icon": "S3_destructor",
+        "iconxScale": 0.5,
+        "iconyScale": 0.5,
+        "attackDamageWalker":5.0,
+        "cost1":2.0,
+        "getHitRadius":0.01,
+        "display":"destructor",
+        "attackRange":2.5,
+        "shorthand":"DF",
+        "startHealth":90.0,
+        "unitCategory": 0,
+        "refundPercentage": 0.75,
+        "turnsRequiredToRemove": 1,
+        "upgrade": {
+            "cost1": 4.0,
+            "attackRange":3.5,
+            "attackDamageWalker":15.0
+        }
+        },
+        {
+        "icon": "S3_ping",
+        "iconxScale": 0.7,
+        "iconyScale": 0.7,
+        "attackDamageTower":2.0,
+        "attackDamageWalker":2.0,
+        "playerBreachDamage":1.0,
+        "cost2":1.0,
+        "getHitRadius":0.01,
+        "display":"ping",
+        "attackRange":3.5,
+        "shorthand":"PI",
+        "startHealth":15.0,
+        "speed":1,
+        "unitCategory": 1,
+        "selfDestructDamageWalker": 15.0,
+        "selfDestructDamageTower": 15.0,
+        "metalForBreach": 1.0,
+        "selfDestructRange": 1.5,
+        "selfDestructStepsRequired": 5
+        },
+        {
+        "icon": "S3_emp",
+        "iconxScale": 0.47,
+        "iconyScale": 0.47,
+        "attackDamageWalker":6.0,
+        "attackDamageTower":6.0,
+        "playerBreachDamage":1.0,
+        "cost2":3.0,
+        "getHitRadius":0.01,
+        "display":"emp",
+        "attackRange":4.5,
+        "shorthand":"EI",
+        "startHealth":5.0,
+        "speed":0.5,
+        "unitCategory": 1,
+        "selfDestructDamageWalker": 5.0,
+        "selfDestructDamageTower": 5.0,
+        "metalForBreach": 1.0,
+        "selfDestructRange": 1.5,
+        "selfDestructStepsRequired": 5
+        },
+        {
+        "icon": "S3_scrambler",
+        "iconxScale": 0.5,
+        "iconyScale": 0.5,
+        "attackDamageWalker":20.0,
+        "playerBreachDamage":1.0,
+        "cost2":1.0,
+        "getHitRadius":0.01,
+        "display":"scrambler",
+        "attackRange":4.5,
+        "shorthand":"SI",
+        "startHealth":40.0,
+        "speed":0.25,
+        "unitCategory": 1,
+        "selfDestructDamageWalker": 40.0,
+        "selfDestructDamageTower": 40.0,
+        "metalForBreach": 1.0,
+        "selfDestructRange": 1.5,
+        "selfDestructStepsRequired": 5
+        },
+        {
+        "display":"Remove",
+        "shorthand":"RM",
+        "icon": "S3_removal",
+        "iconxScale": 0.4,
+        "iconyScale": 0.4
+        },
+        {
+        "display":"Upgrade",
+        "shorthand":"UP",
+        "icon": "S3_upgrade",
+        "iconxScale": 0.4,
+        "iconyScale": 0.4
+        }
+    ],
+    "timingAndReplay":{
+        "waitTimeBotMax":35000,
+        "playWaitTimeBotMax":40000,
+        "waitTimeManual":1820000,
+        "waitForever":false,
+        "waitTimeBotSoft":5000,
+        "playWaitTimeBotSoft":10000,
+        "replaySave":1,
+        "playReplaySave":0,
+        "storeBotTimes":true,
+        "waitTimeStartGame":3000,
+        "waitTimeEndGame":3000
+    },
+    "resources":{
+        "turnIntervalForBitCapSchedule":10,
+        "turnIntervalForBitSchedule":10,
+        "bitRampBitCapGrowthRate":5.0,
+        "roundStartBitRamp":10,
+        "bitGrowthRate":1.0,
+        "startingHP":40.0,
+        "maxBits":150.0,
+        "bitsPerRound":5.0,
+        "coresPerRound":5.0,
+        "coresForPlayerDamage":1.0,
+        "startingBits":5.0,
+        "bitDecayPerRound":0.25,
+        "startingCores":20.0
+    },
+    "misc":{
+        "numBlockedLocations": 0,
+        "blockedLocations": [
+        ]
+    }
+}
+"""
+TURN_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
+
 
 class BasicTests(unittest.TestCase):
 
     def make_turn_0_map(self):
-        config = """
-            {
-            "seasonCompatibilityModeP1": 5,
-            "seasonCompatibilityModeP2": 5,
-            "debug":{
-                "printMapString":false,
-                "printTStrings":false,
-                "printActStrings":false,
-                "printHitStrings":false,
-                "printPlayerInputStrings":false,
-                "printBotErrors":true,
-                "printPlayerGetHitStrings":false
-            },
-            "unitInformation": [
-                {
-                "icon": "S3_filter",
-                "iconxScale": 0.4,
-                "iconyScale": 0.4,
-                "cost1": 1.0,
-                "getHitRadius":0.01,
-                "display":"filter",
-                "shorthand":"FF",
-                "startHealth":75.0,
-                "unitCategory": 0,
-                "refundPercentage": 0.75,
-                "turnsRequiredToRemove": 1,
-                "upgrade": {
-                    "startHealth": 150.0
-                }
-                },
-                {
-                "icon": "S3_encryptor",
-                "iconxScale": 0.5,
-                "iconyScale": 0.5,
-                "cost1":4.0,
-                "getHitRadius":0.01,
-                "display":"encryptor",
-                "shieldRange":0,
-                "shorthand":"EF",
-                "startHealth":30.0,
-                "unitCategory": 0,
-                "refundPercentage": 0.75,
-                "turnsRequiredToRemove": 1,
-                "generatesResource1": 1,
-                "upgrade": {
-                    "generatesResource2": 1
-                }
-                },
-                {
-                "icon": "S3_destructor",
-                "iconxScale": 0.5,
-                "iconyScale": 0.5,
-                "attackDamageWalker":5.0,
-                "cost1":2.0,
-                "getHitRadius":0.01,
-                "display":"destructor",
-                "attackRange":2.5,
-                "shorthand":"DF",
-                "startHealth":90.0,
-                "unitCategory": 0,
-                "refundPercentage": 0.75,
-                "turnsRequiredToRemove": 1,
-                "upgrade": {
-                    "cost1": 4.0,
-                    "attackRange":3.5,
-                    "attackDamageWalker":15.0
-                }
-                },
-                {
-                "icon": "S3_ping",
-                "iconxScale": 0.7,
-                "iconyScale": 0.7,
-                "attackDamageTower":2.0,
-                "attackDamageWalker":2.0,
-                "playerBreachDamage":1.0,
-                "cost2":1.0,
-                "getHitRadius":0.01,
-                "display":"ping",
-                "attackRange":3.5,
-                "shorthand":"PI",
-                "startHealth":15.0,
-                "speed":1,
-                "unitCategory": 1,
-                "selfDestructDamageWalker": 15.0,
-                "selfDestructDamageTower": 15.0,
-                "metalForBreach": 1.0,
-                "selfDestructRange": 1.5,
-                "selfDestructStepsRequired": 5
-                },
-                {
-                "icon": "S3_emp",
-                "iconxScale": 0.47,
-                "iconyScale": 0.47,
-                "attackDamageWalker":6.0,
-                "attackDamageTower":6.0,
-                "playerBreachDamage":1.0,
-                "cost2":3.0,
-                "getHitRadius":0.01,
-                "display":"emp",
-                "attackRange":4.5,
-                "shorthand":"EI",
-                "startHealth":5.0,
-                "speed":0.5,
-                "unitCategory": 1,
-                "selfDestructDamageWalker": 5.0,
-                "selfDestructDamageTower": 5.0,
-                "metalForBreach": 1.0,
-                "selfDestructRange": 1.5,
-                "selfDestructStepsRequired": 5
-                },
-                {
-                "icon": "S3_scrambler",
-                "iconxScale": 0.5,
-                "iconyScale": 0.5,
-                "attackDamageWalker":20.0,
-                "playerBreachDamage":1.0,
-                "cost2":1.0,
-                "getHitRadius":0.01,
-                "display":"scrambler",
-                "attackRange":4.5,
-                "shorthand":"SI",
-                "startHealth":40.0,
-                "speed":0.25,
-                "unitCategory": 1,
-                "selfDestructDamageWalker": 40.0,
-                "selfDestructDamageTower": 40.0,
-                "metalForBreach": 1.0,
-                "selfDestructRange": 1.5,
-                "selfDestructStepsRequired": 5
-                },
-                {
-                "display":"Remove",
-                "shorthand":"RM",
-                "icon": "S3_removal",
-                "iconxScale": 0.4,
-                "iconyScale": 0.4
-                },
-                {
-                "display":"Upgrade",
-                "shorthand":"UP",
-                "icon": "S3_upgrade",
-                "iconxScale": 0.4,
-                "iconyScale": 0.4
-                }
-            ],
-            "timingAndReplay":{
-                "waitTimeBotMax":35000,
-                "playWaitTimeBotMax":40000,
-                "waitTimeManual":1820000,
-                "waitForever":false,
-                "waitTimeBotSoft":5000,
-                "playWaitTimeBotSoft":10000,
-                "replaySave":1,
-                "playReplaySave":0,
-                "storeBotTimes":true,
-                "waitTimeStartGame":3000,
-                "waitTimeEndGame":3000
-            },
-            "resources":{
-                "turnIntervalForBitCapSchedule":10,
-                "turnIntervalForBitSchedule":10,
-                "bitRampBitCapGrowthRate":5.0,
-                "roundStartBitRamp":10,
-                "bitGrowthRate":1.0,
-                "startingHP":40.0,
-                "maxBits":150.0,
-                "bitsPerRound":5.0,
-                "coresPerRound":5.0,
-                "coresForPlayerDamage":1.0,
-                "startingBits":5.0,
-                "bitDecayPerRound":0.25,
-                "startingCores":20.0
-            },
-            "misc":{
-                "numBlockedLocations": 0,
-                "blockedLocations": [
-                ]
-            }
-        }
-        """
-        turn_0 = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[],"spawn":[],"death":[],"attack":[],"melee":[]}}"""
-        
-        state = GameState(json.loads(config), turn_0)
+        state = GameState(json.loads(TEST_CONFIG), TURN_0)
         state.suppress_warnings(True)
         return state
 
@@ -256,6 +265,712 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def test_find_path_to_edge(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual([13, 0], path[0], "Path should start at the spawn location")
+        self.assertIn(path[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Path should end on the top right edge")
+
+        for x in range(28):
+            game.game_map.add_unit("FF", [x, 13], 1)
+        blocked_path = game.find_path_to_edge([13, 0])
+        self.assertEqual([26, 12], blocked_path[-1], "Unit should self destruct at the most ideal reachable tile")
+        game.game_map.remove_unit([20, 13])
+        self.assertIn(game.find_path_to_edge([13, 0])[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Reused pathfinder should see the opened wall")
+
+    def test_idealness_tables(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        finder = game._shortest_path_finder
+        finder.initialize_map(game)
+
+        targets = game_map.get_edges() + [[[13, 5], [14, 5]], [[20, 20]]]
+        for end_points in targets:
+            key = tuple(x * 28 + y for x, y in end_points)
+            table = EDGE_IDEALNESS[key] if end_points in game_map.get_edges() else idealness_table(end_points)
+            for location in game_map:
+                expected = finder._get_idealness(location, end_points)
+                self.assertEqual(expected, table[location[0] * 28 + location[1]],
+                                 "Idealness of {} towards {} differs".format(location, end_points[0]))
+
+    def test_path_tie_breaks(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        finder = game._shortest_path_finder
+        finder.initialize_map(game)
+        rng = random.Random(3)
+        locations = [location for location in game_map]
+        edges = game_map.get_edges()
+
+        def reference_path(start_point, end_points):
+            # The step by step walk the engine does, one _choose_next_move per step
+            path = [start_point]
+            current = start_point
+            move_direction = 0
+            while not finder.pathlength[current[0] * 28 + current[1]] == 0:
+                next_move = finder._choose_next_move(current, move_direction, end_points)
+                move_direction = finder.VERTICAL if current[0] == next_move[0] else finder.HORIZONTAL
+                path.append(next_move)
+                current = next_move
+            return path
+
+        for board in range(2000):
+            density = rng.random() * 0.5
+            blocked = bytearray(28 * 28)
+            for x, y in locations:
+                if rng.random() < density:
+                    blocked[x * 28 + y] = 1
+            finder.blocked = blocked
+            end_points = rng.choice(edges)
+            start = rng.choice(locations)
+            if blocked[start[0] * 28 + start[1]]:
+                continue
+            finder._validate(end_points[0], end_points)
+            if finder.pathlength[start[0] * 28 + start[1]] < 0:
+                finder._validate(finder._idealness_search(start, end_points), end_points)
+            self.assertEqual(reference_path(start, end_points), finder._get_path(start, end_points),
+                             "Path from {} differs on board {}".format(start, board))
+
+    def test_distance_field_cache(self):
+        game = self.make_turn_0_map()
+        for x in range(2, 26):
+            game.game_map.add_unit("FF", [x, 12], 1)
+        ShortestPathFinder.clear_cache()
+        finder = game._shortest_path_finder
+        searches = []
+        validate = finder._validate
+        finder._validate = lambda *args: searches.append(args) or validate(*args)
+
+        game_map = game.game_map
+        edges = game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)
+        paths = [game.find_path_to_edge(location) for location in edges]
+        self.assertEqual(28, len([path for path in paths if path]), "Every edge location should have a path")
+        self.assertLessEqual(len(searches), 4, "One search per edge and pocket expected, got {}".format(len(searches)))
+
+        game_map.remove_unit([10, 12])
+        self.assertIn(game.find_path_to_edge([13, 0])[-1], game_map.get_edge_locations(game_map.TOP_RIGHT), "Removing a wall should invalidate the cached field")
+
+    def test_find_paths_from_edges(self):
+        game = self.make_turn_0_map()
+        for x in range(3, 25):
+            game.game_map.add_unit("FF", [x, 11], 0)
+        game.game_map.add_unit("FF", [13, 0], 0)
+        paths = game.find_paths_from_edges()
+        self.assertEqual(27, len(paths), "Every open friendly edge location should have a path")
+        self.assertNotIn((13, 0), paths, "Blocked locations should be left out")
+        finder = game._shortest_path_finder
+        for location, path in paths.items():
+            end_points = game.game_map.get_edge_locations(game.get_target_edge(location))
+            self.assertEqual(finder.navigate_multiple_endpoints(list(location), end_points, game), path, "Batched path from {} differs".format(location))
+        self.assertEqual([(7, 6)], list(game.find_paths_from_edges([[7, 6]])), "Only the requested locations should be returned")
+
+    def test_path_cache(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        version = game_map.version
+        game_map.add_unit("FF", [13, 11], 0)
+        game_map.add_unit("EF", [13, 11], 0)
+        self.assertEqual(version + 1, game_map.version, "Replacing a structure keeps the layout and the version")
+        game_map.add_unit("PI", [14, 11], 0)
+        self.assertEqual(version + 1, game_map.version, "Mobile units should not change the version")
+
+        path = game.find_path_to_edge([13, 0])
+        self.assertIs(path, game.find_path_to_edge([13, 0]), "Unchanged board should be served from the cache")
+        self.assertIsNot(path, game.find_path_to_edge([13, 0], game_map.TOP_LEFT), "Target edge is part of the key")
+        paths = game.find_paths_from_edges([[13, 0], [14, 0]])
+        self.assertIs(path, paths[(13, 0)], "Batched queries share the cache")
+        self.assertEqual((2, 3), (game.path_cache_hits, game.path_cache_misses))
+
+        game_map.add_unit("FF", [13, 1], 0)
+        self.assertEqual(version + 2, game_map.version)
+        new_path = game.find_path_to_edge([13, 0])
+        self.assertNotEqual(path, new_path, "A new structure should invalidate cached paths")
+        self.assertEqual(4, game.path_cache_misses)
+
+    def test_incremental_repair(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        rng = random.Random(20)
+        locations = [location for location in game_map]
+        for location in rng.sample(locations, 150):
+            game_map.add_unit("FF", location, 0)
+        edge = game_map.get_edge_locations(game_map.TOP_RIGHT)
+
+        finder = game._shortest_path_finder
+        for _ in range(30):
+            finder.initialize_map(game)
+            finder._get_field(edge[0], edge)
+            location = rng.choice(locations)
+            if game.contains_stationary_unit(location):
+                game_map.remove_unit(location)
+            else:
+                game_map.add_unit("DF", location, 1)
+
+            finder.initialize_map(game)
+            repaired = finder._get_field(edge[0], edge)
+            ShortestPathFinder.clear_cache()
+            finder.initialize_map(game)
+            searched = finder._get_field(edge[0], edge)
+            for index, blocked in enumerate(searched.blocked):
+                self.assertEqual(blocked, repaired.blocked[index], "Blocked cells differ after changing {}".format(location))
+                if not blocked:
+                    self.assertEqual(searched.pathlength[index], repaired.pathlength[index], "Repaired field differs after changing {}".format(location))
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_numpy_distance_fields(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        rng = random.Random(7)
+        locations = [location for location in game_map]
+        edge = game_map.get_edge_locations(game_map.BOTTOM_LEFT)
+        finder = game._shortest_path_finder
+
+        masks = []
+        expected = []
+        for _ in range(5):
+            for location in rng.sample(locations, 60):
+                game_map.add_unit("FF", location, 0)
+            finder.initialize_map(game)
+            expected.append(list(finder._validate(edge[0], edge)))
+            masks.append(game_map.structure_mask)
+
+        ShortestPathFinder.clear_cache()
+        fields = finder.batch_edge_fields(masks, edge)
+        for layout, field in enumerate(fields):
+            self.assertEqual(expected[layout], field.ravel().tolist(), "NumPy field differs for layout {}".format(layout))
+
+        blocked = [[bool(game.contains_stationary_unit([x, y])) if game_map.in_arena_bounds([x, y]) else False for y in range(28)] for x in range(28)]
+        self.assertEqual(expected[-1], numpy_distance_fields(blocked, edge).ravel().tolist(), "Single layout NumPy field differs")
+
+        searches = []
+        validate = finder._validate
+        finder._validate = lambda *args: searches.append(args) or validate(*args)
+        finder.initialize_map(game)
+        finder._get_field(edge[0], edge)
+        self.assertEqual([], searches, "Batched fields should be served from the cache")
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 11], 0)
+        game.game_map.add_unit("PI", [14, 10], 0)
+        game.attempt_spawn("FF", [12, 11])
+        path = game.find_path_to_edge([13, 0])
+
+        fork = game.fork()
+        self.assertIs(game.config, fork.config, "Config should be shared")
+        self.assertEqual(path, fork.find_path_to_edge([13, 0]))
+        fork.game_map[13, 11][0].health = 1
+        fork.game_map.add_unit("PI", [14, 10], 0)
+        fork.game_map.remove_unit([12, 11])
+        fork.attempt_spawn("FF", [10, 11])
+        self.assertEqual(90, game.game_map[13, 11][0].health, "Damage in a fork should not reach the original")
+        self.assertEqual(1, len(game.game_map[14, 10]))
+        self.assertTrue(game.contains_stationary_unit([12, 11]))
+        self.assertFalse(game.contains_stationary_unit([10, 11]))
+        self.assertEqual([("FF", 12, 11)], game._build_stack)
+        self.assertNotEqual(game.get_resource(game.SP), fork.get_resource(game.SP))
+        self.assertEqual(path, game.find_path_to_edge([13, 0]))
+
+        game.game_map[14, 10][0].health = 5
+        game.game_map.add_unit("EF", [15, 11], 0)
+        self.assertEqual([15, 15], [unit.health for unit in fork.game_map[14, 10]], "Changes to the original should not reach a fork")
+        self.assertFalse(fork.contains_stationary_unit([15, 11]))
+
+    def test_overlay(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        game_map.add_unit("DF", [13, 11], 0)
+        game_map.add_unit("FF", [12, 11], 0)
+        mask, version = game_map.structure_mask, game_map.version
+
+        planned = game.overlay()
+        overlay = planned.game_map
+        self.assertEqual({}, overlay.changed_cells, "Nothing should be copied up front")
+        self.assertEqual(90, overlay[13, 11][0].health, "Untouched cells read through to the base")
+        overlay[13, 11][0].health = 1
+        overlay.remove_unit([12, 11])
+        overlay.add_unit("FF", [10, 11], 0)
+        overlay.add_unit("PI", [10, 12], 0)
+        self.assertEqual(90, game_map[13, 11][0].health, "The base should not be changed")
+        self.assertTrue(game.contains_stationary_unit([12, 11]))
+        self.assertFalse(game.contains_stationary_unit([10, 11]))
+        self.assertEqual([], game_map[10, 12])
+        self.assertEqual((mask, version), (game_map.structure_mask, game_map.version))
+        self.assertEqual(4, len(overlay.changed_cells))
+
+        expected = game.fork()
+        expected.game_map.remove_unit([12, 11])
+        expected.game_map.add_unit("FF", [10, 11], 0)
+        self.assertEqual(expected.game_map.structure_mask, overlay.structure_mask)
+        self.assertNotEqual(version, overlay.version)
+        self.assertEqual(expected.find_path_to_edge([13, 0]), planned.find_path_to_edge([13, 0]))
+
+        copied = overlay.fork()
+        copied.add_unit("EF", [12, 11], 0)
+        copied[13, 11][0].health = 2
+        self.assertFalse(planned.contains_stationary_unit([12, 11]), "Forks of an overlay should be independent")
+        self.assertEqual(1, overlay[13, 11][0].health)
+
+    def test_unit_arrays(self):
+        state = json.loads(TURN_0)
+        state["p1Units"] = [[[0, 13, 60, "1"], [1, 13, 60, "2"]], [], [[3, 12, 75, "3"]], [], [], [], [[1, 13, 0, "4"]], [[0, 13, 0, "5"]]]
+        game = GameState(json.loads(TEST_CONFIG), json.dumps(state))
+        game_map = game.game_map
+        arrays = game_map.unit_arrays
+        index = lambda x, y: x * 28 + y
+        self.assertEqual([0, 0, 0, -1], [arrays.structure_owner[index(x, y)] for x, y in [[0, 13], [1, 13], [3, 12], [5, 12]]])
+        self.assertEqual([0, 0, 2, -1], [arrays.structure_type[index(x, y)] for x, y in [[0, 13], [1, 13], [3, 12], [5, 12]]])
+        self.assertEqual(1, arrays.structure_upgraded[index(0, 13)], "Parsed upgrades should be recorded")
+        self.assertEqual(1, arrays.structure_pending_removal[index(1, 13)], "Parsed removals should be recorded")
+        self.assertEqual(75, arrays.structure_health[index(3, 12)])
+
+        game_map.add_unit("PI", [13, 0], 0)
+        game_map.add_unit("PI", [13, 0], 0)
+        game_map.add_unit("EI", [13, 0], 1)
+        self.assertEqual((2, 1, 0), (arrays.mobile_count([13, 0], 0, "PI"), arrays.mobile_count([13, 0], 1, "EI"), arrays.mobile_count([13, 0], 1, "PI")))
+        game_map.remove_unit([13, 0])
+        game_map.remove_unit([3, 12])
+        self.assertEqual((0, -1), (arrays.mobile_count([13, 0], 0, "PI"), arrays.structure_type[index(3, 12)]))
+
+        fork = game.fork()
+        fork.game_map.add_unit("DF", [5, 12], 1)
+        self.assertEqual(-1, arrays.structure_type[index(5, 12)], "A fork should not write to the original's arrays")
+        self.assertEqual(2, fork.game_map.unit_arrays.structure_type[index(5, 12)])
+        fork.game_map[5, 12][0].health = 10
+        fork.game_map.refresh_cell([5, 12])
+        self.assertEqual(10, fork.game_map.unit_arrays.structure_health[index(5, 12)])
+
+        if np is not None:
+            views = fork.game_map.unit_arrays.numpy_views()
+            self.assertEqual(1, views["structure_owner"][5, 12])
+            fork.game_map.add_unit("EI", [14, 27], 1)
+            self.assertEqual(1, views["mobile_counts"][1, 1, 14, 27], "Views should follow later changes")
+
+    def test_get_attackers_skips_empty_cells(self):
+        game = self.make_turn_0_map()
+        rng = random.Random(5)
+        locations = [location for location in game.game_map]
+        for location in rng.sample(locations, 120):
+            game.game_map.add_unit(rng.choice(["FF", "EF", "DF", "PI", "EI", "DF"]), location, rng.randint(0, 1))
+        for location in rng.sample(locations, 40):
+            for player_index in [0, 1]:
+                expected = []
+                for location_unit in game.game_map.get_locations_in_range(location, 4.5):
+                    for unit in game.game_map[location_unit]:
+                        if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and game.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
+                            expected.append(unit)
+                self.assertEqual(expected, game.get_attackers(location, player_index))
+
+    def test_next_turn(self):
+        config = json.loads(TEST_CONFIG)
+        rng = random.Random(21)
+        locations = [location for location in GameState(config, TURN_0).game_map]
+        board = {}
+
+        def turn_string(turn_number):
+            # Build, damage and destroy a few structures, upgrade or mark some for removal
+            for location in rng.sample(locations, 12):
+                key = tuple(location)
+                if key in board and rng.random() < 0.4:
+                    del board[key]
+                elif key in board:
+                    board[key][2] = rng.choice([board[key][2], board[key][2] / 2])
+                    board[key][3] = board[key][3] or rng.random() < 0.3
+                    board[key][4] = rng.random() < 0.2
+                else:
+                    board[key] = [rng.randint(0, 2), int(location[1] >= 14), rng.choice([20.0, 40.0]), False, False]
+            state = json.loads(TURN_0)
+            state["turnInfo"] = [0, turn_number, -1]
+            state["p1Stats"] = [30.0, float(turn_number), 5.0, 0]
+            units = [[[] for _ in range(8)] for _ in range(2)]
+            for (x, y), (type_index, player_index, health, upgraded, removal) in sorted(board.items()):
+                units[player_index][type_index].append([x, y, health, ""])
+                if removal:
+                    units[player_index][6].append([x, y, 0, ""])
+                if upgraded:
+                    units[player_index][7].append([x, y, 0, ""])
+            if turn_number % 3 == 0:
+                units[0][3].append([13, 0, 15.0, ""])
+            state["p1Units"], state["p2Units"] = units
+            return json.dumps(state)
+
+        def snapshot(game):
+            game_map = game.game_map
+            cells = [[(unit.unit_type, unit.player_index, unit.health, unit.upgraded, unit.pending_removal, unit.x, unit.y)
+                      for unit in game_map[location]] for location in locations]
+            arrays = game_map.unit_arrays
+            return (cells, game_map.structure_mask, game_map.structure_boards, arrays.structure_health.tolist(), bytes(arrays.structure_upgraded),
+                    bytes(arrays.structure_pending_removal), arrays.mobile_counts.tolist(), arrays.mobile_masks,
+                    game.turn_number, game.get_resources(0), game.get_resources(1))
+
+        game = GameState(config, turn_string(0))
+        for turn_number in range(1, 15):
+            serialized_string = turn_string(turn_number)
+            before = snapshot(game)
+            path = game.find_path_to_edge([13, 0])
+            next_game = game.next_turn(serialized_string)
+            self.assertEqual(snapshot(GameState(config, serialized_string)), snapshot(next_game), "Turn {} was parsed differently".format(turn_number))
+            self.assertEqual(before, snapshot(game), "The previous turn should be left as it was")
+            if next_game.game_map.structure_mask == game.game_map.structure_mask:
+                self.assertIs(path, next_game.find_path_to_edge([13, 0]), "Paths on an unchanged board should be reused")
+            game = next_game
+        path = game.find_path_to_edge([13, 0])
+        threats = game.threat_map(0)
+        same_game = game.next_turn(game.serialized_string)
+        self.assertIs(path, same_game.find_path_to_edge([13, 0]), "Paths on an unchanged board should be reused")
+        self.assertIs(threats, same_game.threat_map(0))
+
+    def test_get_targets(self):
+        game = self.make_turn_0_map()
+        rng = random.Random(13)
+        locations = [location for location in game.game_map]
+        for location in rng.sample(locations, 150):
+            player_index = rng.randint(0, 1)
+            if rng.random() < 0.5:
+                game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, player_index)
+            else:
+                for _ in range(rng.randint(1, 3)):
+                    game.game_map.add_unit(rng.choice(["PI", "EI", "SI"]), location, player_index)
+            for unit in game.game_map[location]:
+                # Few distinct values, so every level of the tie break gets exercised
+                unit.health = rng.choice([5, 10, 10, 20])
+            game.game_map.refresh_cell(location)
+        attackers = [unit for location in locations for unit in game.game_map[location]]
+        self.assertEqual([game.get_target(unit) for unit in attackers], game.get_targets(attackers))
+        self.assertEqual([], game.get_targets([]))
+
+        fork = game.fork()
+        fork.game_map.add_unit("SI", [13, 0], 0)
+        self.assertNotEqual(list(fork.game_map.unit_locations()), list(game.game_map.unit_locations()))
+        self.assertEqual([game.get_target(unit) for unit in attackers], game.get_targets(attackers))
+
+        # The overlay reads copies of the base's units, so they are compared by what and where they are
+        def describe(units):
+            return [None if unit is None else (unit.unit_type, unit.player_index, unit.x, unit.y) for unit in units]
+
+        planned = game.overlay()
+        self.assertEqual(describe(game.get_targets(attackers)), describe(planned.get_targets(attackers)))
+        self.assertEqual([describe(game.get_attackers(location, 0)) for location in locations[:100]],
+                         [describe(planned.get_attackers(location, 0)) for location in locations[:100]])
+        self.assertEqual(game.game_map.get_locations_in_range([13, 13], 3.5), planned.game_map.get_locations_in_range([13, 13], 3.5))
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        rng = random.Random(8)
+        locations = [location for location in game.game_map]
+        for location in rng.sample(locations, 120):
+            game.game_map.add_unit(rng.choice(["FF", "EF", "DF", "DF"]), location, rng.randint(0, 1))
+        for location in rng.sample(locations, 60):
+            for unit in game.game_map[location]:
+                unit.upgrade()
+            game.game_map.refresh_cell(location)
+
+        def check():
+            for player_index in [0, 1]:
+                threats = game.threat_map(player_index)
+                for location in locations:
+                    attackers = [unit for unit in game.get_attackers(location, player_index) if unit.stationary]
+                    index = location[0] * 28 + location[1]
+                    self.assertEqual(len(attackers), threats.attackers[index])
+                    self.assertEqual(sum(unit.damage_i for unit in attackers), threats.damage_i[index])
+                    self.assertEqual(sum(unit.damage_f for unit in attackers), threats.damage_f[index])
+
+        check()
+        self.assertIs(game.threat_map(0), game.threat_map(0), "The threat map should be cached")
+        threats = game.threat_map(0)
+        game.game_map.add_unit("DF", [13, 14], 1)
+        game.game_map.remove_unit([13, 14])
+        self.assertIs(threats, game.threat_map(0), "The same layout should reuse the threat map")
+        game.game_map.add_unit("DF", [13, 14], 1)
+        game.game_map.add_unit("PI", [13, 13], 1)
+        game.game_map[13, 14][0].upgrade()
+        game.game_map.refresh_cell([13, 14])
+        check()
+        path = game.find_path_to_edge([13, 0])
+        expected = sum(unit.damage_i for location in path for unit in game.get_attackers(location, 0) if unit.stationary)
+        self.assertEqual(expected, game.get_path_damage(path, 0))
+
+    def test_shield_map(self):
+        config = json.loads(TEST_CONFIG)
+        config["unitInformation"][1].update({"shieldRange": 3.5, "shieldPerUnit": 3.0, "shieldBonusPerY": 0.0,
+                                             "upgrade": {"shieldRange": 7, "shieldPerUnit": 4, "shieldBonusPerY": 0.3}})
+        game = GameState(config, TURN_0)
+        game.suppress_warnings(True)
+        game_map = game.game_map
+        for location, player_index in [([5, 11], 0), ([13, 2], 0), ([20, 9], 0), ([13, 20], 1), ([13, 10], 1)]:
+            game_map.add_unit("EF", location, player_index)
+        game_map.add_unit("DF", [8, 10], 0)
+        game_map[20, 9][0].upgrade()
+        game_map.refresh_cell([20, 9])
+        game_map[13, 20][0].upgrade()
+        game_map.refresh_cell([13, 20])
+
+        def expected_shields(location, player_index):
+            shields = {}
+            for support in game_map.structure_locations(player_index, "EF"):
+                unit = game_map[support][0]
+                if game_map.distance_between_locations(location, support) < unit.shieldRange + 0.01:
+                    rows_forward = support[1] if player_index == 0 else 27 - support[1]
+                    shields[tuple(support)] = unit.shieldPerUnit + unit.shieldBonusPerY * rows_forward
+            return shields
+
+        for player_index in [0, 1]:
+            shields = game.shield_map(player_index)
+            for location in game_map:
+                self.assertAlmostEqual(sum(expected_shields(location, player_index).values()), shields.shield[location[0] * 28 + location[1]])
+        self.assertAlmostEqual(4 + 0.3 * 9, max(game.shield_map(0).amounts))
+        self.assertAlmostEqual(4 + 0.3 * 7, max(game.shield_map(1).amounts))
+
+        path = game.find_path_to_edge([13, 0])
+        collected = {}
+        for location in path:
+            collected.update(expected_shields(location, 0))
+        self.assertAlmostEqual(sum(collected.values()), game.get_path_shielding(path, 0))
+        self.assertIs(game.shield_map(0), game.shield_map(0), "The shield map should be cached")
+        game_map.remove_unit([5, 11])
+        self.assertEqual(2, len(game.shield_map(0).amounts))
+
+    def test_unit_stats(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 11], 0)
+        game.game_map.add_unit("DF", [14, 11], 1)
+        first, second = game.game_map[13, 11][0], game.game_map[14, 11][0]
+        self.assertIs(first.stats, second.stats, "Units of a type should share their stats")
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertEqual((True, 2.5, 90, [2, 0]), (first.stationary, first.attackRange, first.max_health, first.cost))
+
+        first.upgrade()
+        self.assertTrue(first.upgraded)
+        self.assertEqual((3.5, 15, 6), (first.attackRange, first.damage_i, first.cost[0]))
+        self.assertEqual(2.5, second.attackRange, "Upgrading one unit should not change the others")
+
+    def test_structure_bitboards(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        rng = random.Random(11)
+        locations = [location for location in game_map]
+        for location in rng.sample(locations, 200):
+            game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, rng.randint(0, 1))
+        for location in rng.sample(locations, 50):
+            game_map.remove_unit(location)
+        game_map[13, 13] = []
+        game_map.add_unit("DF", [13, 14], 1)
+        game_map.add_unit("FF", [13, 14], 0)
+
+        for player_index in [0, 1]:
+            for unit_type in ["FF", "EF", "DF", None]:
+                for valid_x, valid_y in [(None, None), ([3, 13, 20], None), (None, [14, 15]), (range(10), range(5, 20))]:
+                    expected = 0
+                    for x, y in locations:
+                        unit = game.contains_stationary_unit([x, y])
+                        if (unit and unit.player_index == player_index and unit_type in (None, unit.unit_type) and
+                                (valid_x is None or x in valid_x) and (valid_y is None or y in valid_y)):
+                            expected += 1
+                    self.assertEqual(expected, game_map.count_structures(player_index, unit_type, valid_x, valid_y))
+        self.assertEqual(game_map.structure_mask, game_map.structure_bitboard())
+        self.assertEqual([location for location in locations if not game.contains_stationary_unit(location)],
+                         game.filter_blocked_locations(locations))
+
+    def test_arena_locations(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        locations = [location for location in game_map]
+        self.assertEqual(420, len(locations))
+        self.assertEqual(sorted(locations, key=lambda location: (location[1], location[0])), locations)
+        self.assertTrue(all(game_map.in_arena_bounds(location) for location in locations))
+        self.assertEqual(420 * 420, sum(1 for _ in game_map for _ in game_map))
+
+        for player_index in [0, 1]:
+            half = game_map.get_half_locations(player_index)
+            self.assertEqual(210, len(half))
+            self.assertTrue(all((location[1] >= 14) == bool(player_index) for location in half))
+        quadrants = [game_map.get_quadrant_locations(quadrant) for quadrant in range(4)]
+        self.assertEqual([105] * 4, [len(quadrant) for quadrant in quadrants])
+        for quadrant in range(4):
+            edge = game_map.get_edge_locations(quadrant)
+            self.assertTrue(all(location in quadrants[quadrant] for location in edge))
+
+        game_map.add_unit("DF", [13, 14], 1)
+        game_map.add_unit("FF", [3, 13], 0)
+        game_map.add_unit("DF", [20, 10], 0)
+        game_map.add_unit("PI", [13, 0], 0)
+        game_map.add_unit("SI", [13, 27], 1)
+        self.assertEqual([[3, 13], [13, 14], [20, 10]], list(game_map.structure_locations()))
+        self.assertEqual([[20, 10]], list(game_map.structure_locations(0, "DF")))
+        self.assertEqual([[13, 14]], list(game_map.structure_locations(1)))
+        self.assertEqual(sorted(location for location in locations if game_map[location]), list(game_map.unit_locations()))
+        game_map.remove_unit([13, 0])
+        self.assertEqual([[3, 13], [13, 14], [13, 27], [20, 10]], list(game_map.unit_locations()))
+
+    def test_range_tables(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        for radius in [0, 1.5, 3.5, 4.5]:
+            for location in game_map:
+                expected = [[x, y] for x in range(28) for y in range(28) if game_map.in_arena_bounds([x, y]) and
+                            game_map.distance_between_locations(location, [x, y]) < radius + 0.01]
+                self.assertEqual(expected, game_map.get_locations_in_range(location, radius))
+                cells, distances = game_map.get_cells_in_range(location, radius)
+                self.assertEqual(expected, [list(CELL_LOCATIONS[index]) for index in cells])
+                self.assertEqual([game_map.distance_between_locations(location, new_location) for new_location in expected], list(distances))
+        self.assertEqual(([], ((), ())), (game_map.get_locations_in_range([-500, -500], 10), game_map.get_cells_in_range([-500, -500], 10)))
+
+    def test_action_frames(self):
+        frame = json.loads(TURN_0)
+        frame["turnInfo"] = [1, 3, 17, 0]
+        quiet_frame = json.dumps(frame, separators=(",", ":"))
+        frame["events"]["breach"] = [[[13, 27], 1, 0, "7", 1]]
+        breach_frame = json.dumps(frame)
+        self.assertEqual([0, 1, 2, None], [message_type(TURN_0), message_type(quiet_frame), message_type('{"turnInfo": [2, 9]}'), message_type("{}")])
+        self.assertEqual((False, True, True), (has_events(quiet_frame, ["breach", "spawn"]), has_events(breach_frame, ["breach"]), has_events(quiet_frame, ["unknown"])))
+
+        action_frame = ActionFrame(breach_frame)
+        self.assertEqual(json.loads(breach_frame), json.loads(action_frame), "An ActionFrame should still be a string")
+        self.assertEqual((3, [[[13, 27], 1, 0, "7", 1]]), (action_frame.turn_number, action_frame.events["breach"]))
+        self.assertIs(action_frame.state, action_frame.state, "A frame should only be parsed once")
+
+        class Recorder(AlgoCore):
+            def on_action_frame(self, action_frame):
+                frames.append(action_frame.turn_info[2])
+
+        for events, expected in [(None, [17, 17]), ([], []), (["breach", "attack"], [17])]:
+            frames = []
+            algo = Recorder()
+            algo.ACTION_FRAME_EVENTS = events
+            self.assertTrue(algo._handle_message(quiet_frame))
+            self.assertTrue(algo._handle_message(breach_frame))
+            self.assertEqual(expected, frames)
+        self.assertFalse(algo._handle_message('{"turnInfo":[2,40,0]}'), "The end message should stop the algo")
+
+    def test_background_work(self):
+        algo = AlgoCore()
+        self.assertIsNone(algo.collect_background())
+        algo.start_background(lambda cancelled, value: value * 2, 21)
+        self.assertEqual(42, algo.collect_background(timeout=5))
+        self.assertIsNone(algo.collect_background(), "A result should only be handed over once")
+
+        steps = []
+
+        def endless(cancelled):
+            while not cancelled():
+                steps.append(1)
+            return "finished"
+
+        algo.start_background(endless)
+        self.assertIsNone(algo.collect_background(timeout=0.01), "Unfinished work should be cancelled")
+        count = len(steps)
+        self.assertEqual(count, len(steps), "Cancelled work should have stopped")
+
+    def test_turn_budget(self):
+        now = [10.0]
+        budget = TurnBudget(2, clock=lambda: now[0])
+        self.assertFalse(budget.expired())
+        self.assertEqual(2, budget.remaining())
+        with budget.phase("parse"):
+            now[0] += 0.5
+        with budget.phase("plan"):
+            now[0] += 1
+        with budget.phase("parse"):
+            now[0] += 0.25
+        self.assertEqual({"parse": 0.75, "plan": 1}, budget.phases)
+        self.assertEqual(1.75, budget.elapsed())
+        self.assertFalse(budget.expired())
+        now[0] += 1
+        self.assertTrue(budget.expired())
+        self.assertEqual(0, budget.remaining())
+
+        config = {"timingAndReplay": {"waitTimeBotSoft": 3000}}
+        self.assertEqual(3 - TurnBudget.SAFETY_MARGIN, TurnBudget.for_config(config).limit)
+        self.assertEqual(TurnBudget.DEFAULT_SOFT_LIMIT / 1000 - TurnBudget.SAFETY_MARGIN, TurnBudget.for_config({}).limit)
+        self.assertFalse(AlgoCore().budget.expired(), "Outside of a turn there should be no limit")
+
+    def test_debug_output(self):
+        stderr = sys.stderr
+        sys.stderr = output = io.StringIO()
+        try:
+            flush_debug()
+            set_debug_output(level=INFO, buffered=True, max_per_turn=2)
+            debug_write("first", 1)
+            debug_write("hidden", level=DEBUG)
+            self.assertEqual("", output.getvalue(), "Messages should wait for the turn to be submitted")
+            debug_write("second")
+            debug_write("third")
+            debug_write("warning", level=WARNING)
+            self.assertFalse(debug_enabled(DEBUG))
+            flush_debug()
+            self.assertEqual("first, 1\nsecond\nwarning\n1 debug messages dropped, see set_debug_output\n", output.getvalue())
+
+            output.truncate(0)
+            output.seek(0)
+            debug_write("next turn")
+            set_debug_output(buffered=False)
+            self.assertEqual("next turn\n", output.getvalue(), "Unbuffering should write what was waiting")
+            set_debug_output(level=OFF)
+            debug_write("off", level=WARNING)
+            flush_debug()
+            self.assertEqual("next turn\n", output.getvalue())
+        finally:
+            set_debug_output(level=INFO, buffered=True, max_per_turn=None)
+            sys.stderr = stderr
+
+    def test_reuse_analysis(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 14], 1)
+        game.game_map.add_unit("FF", [13, 10], 0)
+        warm = game.fork()
+        paths = warm.find_paths_from_edges()
+        threats = warm.threat_map(0)
+
+        same_board = game.fork()
+        same_board.reuse_analysis(warm)
+        self.assertIs(threats, same_board.threat_map(0))
+        hits = same_board.path_cache_hits
+        self.assertIs(paths[(13, 0)], same_board.find_path_to_edge([13, 0]))
+        self.assertEqual(hits + 1, same_board.path_cache_hits)
+
+        other_board = game.fork()
+        other_board.game_map.add_unit("FF", [12, 11], 0)
+        other_board.reuse_analysis(warm)
+        self.assertIsNot(paths[(13, 0)], other_board.find_path_to_edge([13, 0]), "Paths of other structures should not be reused")
+        self.assertIs(threats, other_board.threat_map(0), "Only our own structures changed, so the threat map still holds")
+        other_board.game_map.add_unit("DF", [12, 16], 1)
+        self.assertIsNot(threats, other_board.threat_map(0))
+
+        config = json.loads(TEST_CONFIG)
+
+        def turn_string(turn_number, structures):
+            state = json.loads(TURN_0)
+            state["turnInfo"] = [0, turn_number, -1]
+            units = [[[] for _ in range(8)] for _ in range(2)]
+            for unit_type, player_index, location in structures:
+                units[player_index][["FF", "EF", "DF"].index(unit_type)].append(location + [75.0, ""])
+            state["p1Units"], state["p2Units"] = units
+            return json.dumps(state)
+
+        # Like on_turn, every turn inherits last turn's maps and is given ones computed in the background
+        board = [("DF", 1, [13, 14]), ("FF", 0, [13, 10]), ("EF", 1, [13, 16])]
+        game = GameState(config, turn_string(1, board))
+        game.threat_map(0)
+        game.shield_map(1)
+        for turn_number, location in [(2, [12, 16]), (3, [14, 16])]:
+            warm = game.fork()
+            warm.game_map.add_unit("DF", location, 1)
+            threats, shields = warm.threat_map(0), warm.shield_map(1)
+            wrong_guess = game.fork()
+            wrong_guess.game_map.add_unit("DF", [10, 17], 1)
+            wrong_guess.threat_map(0)
+
+            board.append(("DF", 1, location))
+            game = game.next_turn(turn_string(turn_number, board))
+            game.reuse_analysis(wrong_guess)
+            game.reuse_analysis(warm)
+            self.assertIs(threats, game.threat_map(0), "The background threat map of turn {} should be used".format(turn_number))
+            self.assertIs(shields, game.shield_map(1), "The background shield map of turn {} should be used".format(turn_number))
+
+        game.reuse_analysis(wrong_guess)
+        self.assertIs(threats, game.threat_map(0), "A map of other structures should not replace a current one")
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
@@ -1,3 +1,6 @@
+from collections import namedtuple
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -9,6 +12,54 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+"""
+The stats of every unit type, shared by all the units of that type.
+Built the first time a unit is created with a new config, only the latest config is kept
+"""
+UnitStats = namedtuple("UnitStats", ["type_index", "stationary", "speed", "damage_f", "damage_i", "attackRange", "shieldRange",
+                                     "max_health", "shieldPerUnit", "shieldBonusPerY", "cost"])
+_latest_stats = (None, {})
+
+
+def unit_stats(config, unit_type, upgraded=False):
+    """Gets the stats of a unit type
+
+    Args:
+        config: Contains information about the game
+        unit_type: The type of the unit, its shorthand
+        upgraded: Whether the stats should include the type's upgrade
+
+    Returns:
+        The UnitStats of the unit type
+    """
+    global _latest_stats
+    if _latest_stats[0] is not config:
+        _latest_stats = (config, _build_stats(config))
+    return _latest_stats[1][unit_type, upgraded]
+
+
+def _build_stats(config):
+    stats = {}
+    for type_index, type_config in enumerate(config["unitInformation"]):
+        if "shorthand" not in type_config:
+            continue
+        base = UnitStats(type_index, type_config.get("unitCategory") == 0, type_config.get("speed", 0),
+                         type_config.get("attackDamageTower", 0), type_config.get("attackDamageWalker", 0),
+                         type_config.get("attackRange", 0), type_config.get("shieldRange", 0), type_config.get("startHealth", 0),
+                         type_config.get("shieldPerUnit", 0), type_config.get("shieldBonusPerY", 0),
+                         (type_config.get("cost1", 0), type_config.get("cost2", 0)))
+        upgrade = type_config.get("upgrade", {})
+        upgraded = base._replace(speed=upgrade.get("speed", base.speed), damage_f=upgrade.get("attackDamageTower", base.damage_f),
+                                 damage_i=upgrade.get("attackDamageWalker", base.damage_i), attackRange=upgrade.get("attackRange", base.attackRange),
+                                 shieldRange=upgrade.get("shieldRange", base.shieldRange), max_health=upgrade.get("startHealth", base.max_health),
+                                 shieldPerUnit=upgrade.get("shieldPerUnit", base.shieldPerUnit),
+                                 shieldBonusPerY=upgrade.get("shieldBonusPerY", base.shieldBonusPerY),
+                                 cost=(upgrade.get("cost1", 0) + base.cost[0], upgrade.get("cost2", 0) + base.cost[1]))
+        stats[type_config["shorthand"], False] = base
+        stats[type_config["shorthand"], True] = upgraded
+    return stats
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
@@ -30,8 +81,11 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * stats (UnitStats): The stats shared by every unit of this type and upgrade level, the read only attributes above come from it
 
     """
+    __slots__ = ["unit_type", "config", "player_index", "pending_removal", "upgraded", "x", "y", "health", "stats"]
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
@@ -43,39 +97,24 @@ class GameUnit:
         self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.stats = unit_stats(config, unit_type)
+        self.health = self.stats.max_health if not health else health
 
+    stationary = property(lambda self: self.stats.stationary)
+    speed = property(lambda self: self.stats.speed)
+    damage_f = property(lambda self: self.stats.damage_f)
+    damage_i = property(lambda self: self.stats.damage_i)
+    attackRange = property(lambda self: self.stats.attackRange)
+    shieldRange = property(lambda self: self.stats.shieldRange)
+    max_health = property(lambda self: self.stats.max_health)
+    shieldPerUnit = property(lambda self: self.stats.shieldPerUnit)
+    shieldBonusPerY = property(lambda self: self.stats.shieldBonusPerY)
+    cost = property(lambda self: list(self.stats.cost))
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
+        self.stats = unit_stats(self.config, self.unit_type, True)
         self.upgraded = True
 
-
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
         removal = ", pending removal" if self.pending_removal else ""
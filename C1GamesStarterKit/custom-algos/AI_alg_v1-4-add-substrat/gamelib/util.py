@@ -1,3 +1,4 @@
+import atexit
 import sys
 
 
@@ -29,13 +30,102 @@ def send_command(cmd):
     sys.stdout.write(cmd.strip() + "\n")
     sys.stdout.flush()
 
-def debug_write(*msg):
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+
+class _DebugOutput:
+    """Settings and per-turn state of debug_write. Use set_debug_output to change them
+
+    Attributes :
+        * level (int): Messages below this level are dropped before they are formatted, OFF drops every message
+        * buffered (bool): Whether messages are held until flush_debug instead of written one by one
+        * max_per_turn (int): How many messages below WARNING are kept between two flushes, None for no limit
+        * lines (list): The messages waiting for the next flush
+        * kept (int): How many messages below WARNING were kept since the last flush
+        * dropped (int): How many messages were dropped by max_per_turn since the last flush
+
+    """
+    def __init__(self):
+        self.level = INFO
+        self.buffered = True
+        self.max_per_turn = None
+        self.lines = []
+        self.kept = 0
+        self.dropped = 0
+
+
+_debug = _DebugOutput()
+
+
+def set_debug_output(level=None, buffered=None, max_per_turn=False):
+    """Changes what debug_write prints and when. Arguments left out are not changed
+
+    Args:
+        level: DEBUG, INFO, WARNING, ERROR or OFF. Messages below it cost a single comparison
+        buffered: True to write the turn's messages at once when it is submitted, False to write each right away
+        max_per_turn: How many messages below WARNING to keep per turn, None for no limit
+
+    """
+    if level is not None:
+        _debug.level = level
+    if buffered is not None:
+        _debug.buffered = buffered
+        if not buffered:
+            _write_debug_lines()
+    if max_per_turn is not False:
+        _debug.max_per_turn = max_per_turn
+
+def debug_enabled(level=DEBUG):
+    """Whether debug_write would print a message of the given level.
+    Use it to skip building messages which are expensive to make
+
+    """
+    return level >= _debug.level
+
+def debug_write(*msg, level=INFO):
     """Prints a message to the games debug output
 
+    Messages are buffered and written once the turn is submitted, see set_debug_output.
+
     Args:
         msg: The message to output
+        level: How important the message is, DEBUG for messages from hot loops
 
     """
+    if level < _debug.level:
+        return
+    if level < WARNING and _debug.max_per_turn is not None:
+        if _debug.kept >= _debug.max_per_turn:
+            _debug.dropped += 1
+            return
+        _debug.kept += 1
+    _debug.lines.append(", ".join(map(str, msg)).rstrip() + "\n")
+    if not _debug.buffered:
+        _write_debug_lines()
+
+def flush_debug():
+    """Writes the buffered debug messages and starts a new turn for max_per_turn.
+    Called by 'GameState.submit_turn()' and when the algo exits
+
+    """
+    if _debug.dropped:
+        _debug.lines.append("{} debug messages dropped, see set_debug_output\n".format(_debug.dropped))
+    _debug.kept = 0
+    _debug.dropped = 0
+    _write_debug_lines()
+
+def _write_debug_lines():
+    # Swapped out first, so messages from a background thread land in the next flush
+    lines, _debug.lines = _debug.lines, []
+    if not lines:
+        return
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
-    sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
+    sys.stderr.write("".join(lines))
     sys.stderr.flush()
+
+
+atexit.register(flush_debug)